@@ -5,30 +5,138 @@ This module provides a generic cache wrapper around diskcache with
 utilities for different caching use cases.
 """
 
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any
-from diskcache import Cache as DiskCache
+from typing import Any, Dict, Iterable
+from diskcache import FanoutCache
+
+
+class _SafeCharTable(dict):
+    """str.translate table mapping characters that are unsafe in cache keys to '_'
+
+    Entries are computed on first use so non-ASCII characters follow the same
+    isalnum() rule as ASCII ones.
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        char = chr(codepoint)
+        safe = char if char.isalnum() or char in "-_" else "_"
+        self[codepoint] = safe
+        return safe
+
+
+_SAFE_TABLE = _SafeCharTable()
+
+# SQLite settings for the cache database. synchronous=OFF trades durability
+# on an OS crash or power loss for fewer fsyncs; a crash of the process
+# itself loses nothing already written. Lost entries can be regenerated,
+# but generated ones cost API calls to redo.
+SQLITE_CACHE_SIZE = 2**15  # pages
+SQLITE_MMAP_SIZE = 2**30  # bytes
+SQLITE_SYNCHRONOUS = 0  # OFF
+
+# Number of SQLite shards; keys are spread by hash so concurrent writers rarely
+# contend on the same database lock
+DEFAULT_SHARDS = 8
+CACHE_TIMEOUT = 5  # seconds to wait on a locked shard
+
+# Key parts longer than this are replaced by a digest to keep keys short
+MAX_KEY_PART_LENGTH = 64
+
+# Number of hot entries kept in process memory in front of the disk cache
+MEMORY_CACHE_SIZE = 4096
 
 
 class GenericCache:
     """Generic cache wrapper with utilities for different use cases"""
 
-    def __init__(self, cache_dir: Path):
+    def __init__(
+        self,
+        cache_dir: Path,
+        shards: int = DEFAULT_SHARDS,
+        memory_size: int = MEMORY_CACHE_SIZE,
+    ):
         """Initialize cache with given directory"""
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True, parents=True)
-        self._cache = DiskCache(str(self.cache_dir))
+        self._cache = FanoutCache(
+            str(self.cache_dir),
+            shards=shards,
+            timeout=CACHE_TIMEOUT,
+            sqlite_journal_mode="wal",
+            sqlite_cache_size=SQLITE_CACHE_SIZE,
+            sqlite_mmap_size=SQLITE_MMAP_SIZE,
+            sqlite_synchronous=SQLITE_SYNCHRONOUS,
+        )
+
+        # Small LRU of recently used entries; the lock guards it because
+        # get/set are called from worker threads
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._memory_size = memory_size
+        self._memory_lock = threading.Lock()
+
+    def _remember(self, key: str, value: Any) -> None:
+        """Store an entry in the in-memory LRU, evicting the oldest if full"""
+        with self._memory_lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            if len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
 
     def get(self, key: str) -> Any:
         """Get value from cache"""
-        return self._cache.get(key)
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        value = self._cache.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Get several values at once, returning only the keys that were found
+
+        Reads take no write lock: under WAL they never block the writers.
+        """
+        found = {}
+        missing = []
+        with self._memory_lock:
+            for key in dict.fromkeys(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+        for key in missing:
+            value = self._cache.get(key)
+            if value is not None:
+                found[key] = value
+                self._remember(key, value)
+        return found
 
     def set(self, key: str, value: Any) -> None:
-        """Set value in cache"""
-        self._cache.set(key, value)
+        """Set value in cache
+
+        retry=True keeps waiting on a shard that stays locked past
+        CACHE_TIMEOUT instead of dropping the write.
+        """
+        self._cache.set(key, value, retry=True)
+        self._remember(key, value)
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Set several values, locking only the shard each key lives on"""
+        for key, value in items.items():
+            self.set(key, value)
 
     def clear(self) -> None:
         """Clear all cache entries"""
+        with self._memory_lock:
+            self._memory.clear()
         self._cache.clear()
 
     def __len__(self) -> int:
@@ -45,33 +153,47 @@ class GenericCache:
         return f"conversation_{conversation_hash}_{prompt_version}"
 
     @staticmethod
-    def make_recall_key(
-        conversation_hash: str, query: str, max_query_length: int = 50
-    ) -> str:
-        """Generate cache key for recall verification"""
-        truncated_query = query[:max_query_length]
-        # Replace problematic characters that might cause issues in cache keys
-        safe_query = "".join(
-            c if c.isalnum() or c in "-_" else "_" for c in truncated_query
-        )
-        return f"recall_{conversation_hash}_{safe_query}"
+    def make_recall_key(conversation_hash: str, query: str) -> str:
+        """Generate cache key for recall verification
+
+        The full query is hashed so queries sharing a prefix never collide.
+        Keys written by the old truncated-prefix scheme are simply never hit
+        again; clear the cache to reclaim their space.
+        """
+        query_digest = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+        return f"recall_{conversation_hash}_{query_digest}"
+
+    @staticmethod
+    def make_embedding_key(model_name: str, text: str) -> str:
+        """Generate cache key for a text embedded with a given model
+
+        The full text is hashed, like make_recall_key, so distinct texts never
+        share a key.
+        """
+        text_digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        return f"embedding_{model_name}_{text_digest}"
 
     @staticmethod
     def make_generic_key(*parts: str) -> str:
-        """Generate generic cache key from multiple parts"""
-        safe_parts = []
-        for part in parts:
+        """Generate generic cache key from multiple parts
+
+        Long parts are hashed rather than truncated, like make_recall_key, so
+        keys stay bounded without parts sharing a prefix colliding.
+        """
+        key_parts = []
+        for part in map(str, parts):
+            if len(part) > MAX_KEY_PART_LENGTH:
+                part = hashlib.blake2b(part.encode(), digest_size=16).hexdigest()
             # Replace problematic characters
-            safe_part = "".join(
-                c if c.isalnum() or c in "-_" else "_" for c in str(part)
-            )
-            safe_parts.append(safe_part)
-        return "_".join(safe_parts)
+            key_parts.append(part.translate(_SAFE_TABLE))
+        return "_".join(key_parts)
 
 
-def setup_cache(cache_dir: Path, clear_cache: bool = False) -> GenericCache:
+def setup_cache(
+    cache_dir: Path, clear_cache: bool = False, shards: int = DEFAULT_SHARDS
+) -> GenericCache:
     """Setup and return a configured cache instance"""
-    cache = GenericCache(cache_dir)
+    cache = GenericCache(cache_dir, shards=shards)
 
     if clear_cache:
         print("[yellow]Clearing cache...[/yellow]")
@@ -93,9 +215,15 @@ class NoOpCache:
     def get(self, key: str) -> Any:
         return None
 
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {}
+
     def set(self, key: str, value: Any) -> None:
         pass
 
+    def set_many(self, items: Dict[str, Any]) -> None:
+        pass
+
     def clear(self) -> None:
         pass
 
@@ -2,9 +2,15 @@
 Database utilities using SQLModel
 """
 
+import random
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from functools import cache
+from sqlalchemy import Index, event, literal_column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
 from sqlmodel import SQLModel, Session, create_engine, select, Field
 from core.synthetic_queries import SearchQueries
 
@@ -21,6 +27,12 @@ class Conversation(SQLModel, table=True):
 
 
 class Question(SQLModel, table=True):
+    # Covers the per-version lookups (evaluation, resume filtering) without
+    # touching the table rows
+    __table_args__ = (
+        Index("ix_question_version_conversation_hash", "version", "conversation_hash"),
+    )
+
     id: str = Field(primary_key=True)
     conversation_hash: str = Field(foreign_key="conversation.conversation_hash")
     version: str
@@ -30,6 +42,12 @@ class Question(SQLModel, table=True):
 
 
 class Summary(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_summary_technique_conversation_hash", "technique", "conversation_hash"
+        ),
+    )
+
     id: str = Field(primary_key=True)
     conversation_hash: str = Field(foreign_key="conversation.conversation_hash")
     technique: str
@@ -60,9 +78,86 @@ class EvaluationResult(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# pipeline's writers, and synchronous=NORMAL is durable under WAL without an
+# fsync per commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA analysis_limit=400",
+)
+
+# Extra settings for read-only connections: refuse writes, and read pages
+# through a 256 MiB memory map instead of copying them into the page cache
+SQLITE_READ_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Bound parameters per IN (...) chunk, kept under SQLite's historical limit of 999
+SQLITE_MAX_VARIABLES = 900
+
+# Attempts for a batched write that keeps finding the database locked
+WRITE_ATTEMPTS = 5
+
+
+def _configure_connection(dbapi_connection, connection_record) -> None:
+    """Apply SQLITE_PRAGMAS to a freshly opened connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _configure_read_connection(dbapi_connection, connection_record) -> None:
+    """Apply SQLITE_READ_PRAGMAS to a freshly opened read connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_READ_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@cache
+def _create_engine(db_path: Path, read_only: bool):
+    """Create an engine once per (database, mode) so its pool is reused"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    event.listen(engine, "connect", _configure_connection)
+    if read_only:
+        event.listen(engine, "connect", _configure_read_connection)
+    return engine
+
+
 def get_engine(db_path: Path):
     """Get SQLModel engine for database"""
-    return create_engine(f"sqlite:///{db_path}")
+    return _create_engine(Path(db_path), read_only=False)
+
+
+def get_read_engine(db_path: Path):
+    """Get a read-only SQLModel engine for database
+
+    Queries use their own connection pool so they never queue behind the
+    writer's connections, and any accidental write fails fast.
+    """
+    return _create_engine(Path(db_path), read_only=True)
+
+
+def _execute_write(engine, statement, rows: List[Dict[str, Any]]) -> int:
+    """Run a batched write in one transaction and return the affected row count
+
+    busy_timeout already waits out short locks; if the database is still
+    locked, back off with jitter and retry. Other errors propagate at once.
+    """
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with engine.begin() as connection:
+                return connection.execute(statement, rows).rowcount
+        except OperationalError as e:
+            if "database is locked" not in str(e) or attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0.01, 0.1) * 2**attempt)
 
 
 def clear_database(db_path: Path) -> None:
@@ -78,115 +173,107 @@ def setup_database(db_path: Path) -> None:
     engine = get_engine(db_path)
     SQLModel.metadata.create_all(engine)
 
+    # create_all only builds indexes alongside new tables; add any that an
+    # existing database is missing
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+    analyze_database(db_path)
+
+
+def analyze_database(db_path: Path) -> None:
+    """Refresh the query planner's statistics after a bulk load
+
+    Run once per load rather than per write; analysis_limit keeps it cheap.
+    """
+    with get_engine(db_path).begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+
+def _insert_new_rows(model, rows: List[Dict[str, Any]], db_path: Path) -> int:
+    """Insert rows for a table model in one transaction, skipping existing keys
+
+    Returns the number of rows actually inserted. created_at is filled in here
+    because the models' default_factory does not run for Core inserts.
+    """
+    if not rows:
+        return 0
+
+    created_at = datetime.utcnow()
+    for row in rows:
+        row["created_at"] = created_at
+
+    statement = sqlite_insert(model).on_conflict_do_nothing()
+    return _execute_write(get_engine(db_path), statement, rows)
+
 
 def load_conversations_to_sqlite(
     conversations: List[Dict[str, Any]], db_path: Path
 ) -> int:
     """Load conversations into SQLite database"""
-    engine = get_engine(db_path)
-    inserted = 0
-
-    with Session(engine) as session:
-        for conv in conversations:
-            try:
-                conversation = Conversation(
-                    conversation_hash=conv["conversation_hash"],
-                    text=conv["text"],  # Remove truncation
-                    conversation_full=conv["conversation_full"],
-                    timestamp=conv.get("timestamp"),
-                    language=conv.get("language", "English"),
-                    country=conv.get("country"),
-                )
-                session.add(conversation)
-                session.commit()
-                inserted += 1
-            except Exception as e:
-                print(
-                    f"Error inserting conversation {conv.get('conversation_hash')}: {e}"
-                )
-                session.rollback()
-                continue
-
-    return inserted
+    rows = [
+        {
+            "conversation_hash": conv["conversation_hash"],
+            "text": conv["text"],  # Remove truncation
+            "conversation_full": conv["conversation_full"],
+            "timestamp": conv.get("timestamp"),
+            "language": conv.get("language", "English"),
+            "country": conv.get("country"),
+        }
+        for conv in conversations
+    ]
+    return _insert_new_rows(Conversation, rows, db_path)
 
 
 def save_questions_to_sqlite(questions: List[SearchQueries], db_path: Path) -> int:
-    """Save generated questions to SQLite"""
-    engine = get_engine(db_path)
-    inserted = 0
-
-    with Session(engine) as session:
-        for q in questions:
-            try:
-                question = Question(
-                    id=q["id"],
-                    conversation_hash=q["conversation_hash"],
-                    version=q["version"],
-                    question=q["question"],
-                    experiment_id=q.get("experiment_id"),
-                )
-                session.add(question)
-                session.commit()
-                inserted += 1
-            except Exception as e:
-                print(f"Error inserting question {q.get('id')}: {e}")
-                session.rollback()
-                continue
-
-    return inserted
+    """Save generated questions to SQLite
+
+    All rows are written in a single transaction; questions whose id already
+    exists are skipped.
+    """
+    rows = [
+        {
+            "id": q["id"],
+            "conversation_hash": q["conversation_hash"],
+            "version": q["version"],
+            "question": q["question"],
+            "experiment_id": q.get("experiment_id"),
+        }
+        for q in questions
+    ]
+    return _insert_new_rows(Question, rows, db_path)
 
 
 def save_summaries_to_sqlite(summaries: List[Dict[str, Any]], db_path: Path) -> int:
     """Save generated summaries to SQLite"""
-    engine = get_engine(db_path)
-    inserted = 0
-
-    with Session(engine) as session:
-        for s in summaries:
-            try:
-                summary = Summary(
-                    id=s["id"],
-                    conversation_hash=s["conversation_hash"],
-                    technique=s["technique"],
-                    summary=s["summary"],
-                    experiment_id=s.get("experiment_id"),
-                )
-                session.add(summary)
-                session.commit()
-                inserted += 1
-            except Exception as e:
-                print(f"Error inserting summary {s.get('id')}: {e}")
-                session.rollback()
-                continue
-
-    return inserted
+    rows = [
+        {
+            "id": s["id"],
+            "conversation_hash": s["conversation_hash"],
+            "technique": s["technique"],
+            "summary": s["summary"],
+            "experiment_id": s.get("experiment_id"),
+        }
+        for s in summaries
+    ]
+    return _insert_new_rows(Summary, rows, db_path)
 
 
 def save_evaluations_to_sqlite(evaluations: List[Dict[str, Any]], db_path: Path) -> int:
     """Save evaluation results to SQLite"""
-    engine = get_engine(db_path)
-    inserted = 0
-
-    with Session(engine) as session:
-        for eval_result in evaluations:
-            try:
-                evaluation = Evaluation(
-                    id=eval_result["id"],
-                    question_id=eval_result["question_id"],
-                    summary_id=eval_result.get("summary_id"),
-                    metric_name=eval_result["metric_name"],
-                    metric_value=eval_result["metric_value"],
-                    experiment_id=eval_result.get("experiment_id"),
-                )
-                session.add(evaluation)
-                session.commit()
-                inserted += 1
-            except Exception as e:
-                print(f"Error inserting evaluation {eval_result.get('id')}: {e}")
-                session.rollback()
-                continue
-
-    return inserted
+    rows = [
+        {
+            "id": eval_result["id"],
+            "question_id": eval_result["question_id"],
+            "summary_id": eval_result.get("summary_id"),
+            "metric_name": eval_result["metric_name"],
+            "metric_value": eval_result["metric_value"],
+            "experiment_id": eval_result.get("experiment_id"),
+        }
+        for eval_result in evaluations
+    ]
+    return _insert_new_rows(Evaluation, rows, db_path)
 
 
 def save_detailed_evaluation_results(
@@ -195,33 +282,20 @@ def save_detailed_evaluation_results(
     experiment_id: Optional[str] = None,
 ) -> int:
     """Save detailed evaluation results to SQLite"""
-    engine = get_engine(db_path)
-    inserted = 0
-
-    with Session(engine) as session:
-        for result in detailed_results:
-            try:
-                eval_result = EvaluationResult(
-                    id=f"{result['question_id']}_detail_{experiment_id or 'default'}",
-                    question_id=result["question_id"],
-                    query=result["query"],
-                    target_conversation_hash=result["target"],
-                    found=result["found"],
-                    rank=result.get("rank"),
-                    score=result.get("score"),
-                    experiment_id=experiment_id,
-                )
-                session.add(eval_result)
-                session.commit()
-                inserted += 1
-            except Exception as e:
-                print(
-                    f"Error inserting detailed result {result.get('question_id')}: {e}"
-                )
-                session.rollback()
-                continue
-
-    return inserted
+    rows = [
+        {
+            "id": f"{result['question_id']}_detail_{experiment_id or 'default'}",
+            "question_id": result["question_id"],
+            "query": result["query"],
+            "target_conversation_hash": result["target"],
+            "found": result["found"],
+            "rank": result.get("rank"),
+            "score": result.get("score"),
+            "experiment_id": experiment_id,
+        }
+        for result in detailed_results
+    ]
+    return _insert_new_rows(EvaluationResult, rows, db_path)
 
 
 def get_detailed_evaluation_results(
@@ -230,7 +304,7 @@ def get_detailed_evaluation_results(
     question_version: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """Get detailed evaluation results from SQLite"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
     results = []
 
     with Session(engine) as session:
@@ -243,9 +317,7 @@ def get_detailed_evaluation_results(
         if question_version:
             query = query.join(Question).where(Question.version == question_version)
 
-        eval_results = session.exec(query).all()
-
-        for result in eval_results:
+        for result in session.exec(query):
             results.append(
                 {
                     "question_id": result.question_id,
@@ -262,85 +334,138 @@ def get_detailed_evaluation_results(
     return results
 
 
+def get_question_columns(
+    version: str, db_path: Path, limit: Optional[int] = None
+) -> Tuple[List[str], List[str], List[str]]:
+    """Get (ids, conversation hashes, questions) columns for a question version
+
+    Only the three columns needed for evaluation are selected, avoiding a full
+    ORM object per question.
+    """
+    engine = get_read_engine(db_path)
+
+    with Session(engine) as session:
+        # The version index would otherwise return rows in hash order; keep
+        # insertion order so --limit always picks the same questions
+        statement = (
+            select(Question.id, Question.conversation_hash, Question.question)
+            .where(Question.version == version)
+            .order_by(literal_column("question.rowid"))
+        )
+        if limit:
+            statement = statement.limit(limit)
+        rows = session.exec(statement).all()
+
+    if not rows:
+        return [], [], []
+
+    ids, hashes, questions = (list(column) for column in zip(*rows))
+    return ids, hashes, questions
+
+
 def get_summaries_by_hashes_and_technique(
     conversation_hashes: List[str], technique: str, db_path: Path
 ) -> List[Dict[str, Any]]:
-    """Get summaries by conversation hashes and technique"""
-    engine = get_engine(db_path)
-    summaries = []
+    """Get summaries by conversation hashes and technique
+
+    Hashes are looked up with bound IN parameters in chunks instead of one
+    query per hash; results keep the order of ``conversation_hashes``.
+    """
+    conversation_hashes = list(conversation_hashes)
+    summary_by_hash = {}
 
+    engine = get_read_engine(db_path)
     with Session(engine) as session:
-        for hash_val in conversation_hashes:
-            try:
-                summary = session.exec(
-                    select(Summary).where(
-                        Summary.conversation_hash == hash_val,
-                        Summary.technique == technique,
-                    )
-                ).first()
-
-                if summary:
-                    summaries.append(
-                        {
-                            "conversation_hash": summary.conversation_hash,
-                            "technique": summary.technique,
-                            "summary": summary.summary,
-                        }
-                    )
-            except Exception as e:
-                print(f"Error getting summary for {hash_val}: {e}")
-                continue
-
-    return summaries
+        for i in range(0, len(conversation_hashes), SQLITE_MAX_VARIABLES):
+            statement = select(Summary.conversation_hash, Summary.summary).where(
+                Summary.technique == technique,
+                Summary.conversation_hash.in_(
+                    conversation_hashes[i : i + SQLITE_MAX_VARIABLES]
+                ),
+            )
+            for conversation_hash, summary in session.exec(statement):
+                summary_by_hash.setdefault(conversation_hash, summary)
+
+    return [
+        {
+            "conversation_hash": hash_val,
+            "technique": technique,
+            "summary": summary_by_hash[hash_val],
+        }
+        for hash_val in dict.fromkeys(conversation_hashes)
+        if hash_val in summary_by_hash
+    ]
 
 
 def get_conversations_by_hashes(
     conversation_hashes: List[str], db_path: Path
 ) -> List[Dict[str, Any]]:
-    """Get conversations by their hashes"""
-    engine = get_engine(db_path)
+    """Get conversations by their hashes
 
+    Hashes are bound in chunks of SQLITE_MAX_VARIABLES so large runs stay
+    under SQLite's parameter limit. Repeated hashes are dropped first so a
+    conversation is returned once, as with a single IN query.
+    """
+    conversation_hashes = list(dict.fromkeys(conversation_hashes))
+    conversations = []
+
+    engine = get_read_engine(db_path)
     with Session(engine) as session:
-        statement = select(Conversation).where(
-            Conversation.conversation_hash.in_(conversation_hashes)
-        )
-        conversations = session.exec(statement).all()
-        return [conv.dict() for conv in conversations]
+        for i in range(0, len(conversation_hashes), SQLITE_MAX_VARIABLES):
+            statement = select(Conversation).where(
+                Conversation.conversation_hash.in_(
+                    conversation_hashes[i : i + SQLITE_MAX_VARIABLES]
+                )
+            )
+            conversations.extend(conv.dict() for conv in session.exec(statement))
+
+    return conversations
+
+
+def get_conversations(
+    db_path: Path, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Get conversations in a single query, optionally limited"""
+    engine = get_read_engine(db_path)
+
+    with Session(engine) as session:
+        statement = select(Conversation)
+        if limit:
+            statement = statement.limit(limit)
+        return [conv.dict() for conv in session.exec(statement)]
 
 
 def get_questions_by_technique(
     technique: str, db_path: Path, experiment_id: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Get questions by technique"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
         statement = select(Question).where(Question.technique == technique)
         if experiment_id:
             statement = statement.where(Question.experiment_id == experiment_id)
 
-        questions = session.exec(statement).all()
-        return [q.dict() for q in questions]
+        return [q.dict() for q in session.exec(statement)]
 
 
 def get_summaries_by_technique(
     technique: str, db_path: Path, experiment_id: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Get summaries by technique"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
         statement = select(Summary).where(Summary.technique == technique)
         if experiment_id:
             statement = statement.where(Summary.experiment_id == experiment_id)
 
-        summaries = session.exec(statement).all()
-        return [s.dict() for s in summaries]
+        return [s.dict() for s in session.exec(statement)]
 
 
 def get_evaluation_results(experiment_id: str, db_path: Path) -> List[Dict[str, Any]]:
     """Get evaluation results for an experiment"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
         statement = (
@@ -350,14 +475,13 @@ def get_evaluation_results(experiment_id: str, db_path: Path) -> List[Dict[str,
             .where(Evaluation.experiment_id == experiment_id)
         )
 
-        results = session.exec(statement).all()
         return [
             {
                 **eval_result.dict(),
                 "question_version": question.version,
                 "summary_version": summary.version if summary else None,
             }
-            for eval_result, question, summary in results
+            for eval_result, question, summary in session.exec(statement)
         ]
 
 
@@ -365,32 +489,36 @@ def get_processed_question_hashes(
     version: str, db_path: Path, experiment_id: Optional[str] = None
 ) -> List[str]:
     """Get conversation hashes that already have questions generated for a specific version"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
-        statement = select(Question.conversation_hash).where(
-            Question.version == version
+        statement = (
+            select(Question.conversation_hash)
+            .where(Question.version == version)
+            .distinct()
         )
         if experiment_id:
             statement = statement.where(Question.experiment_id == experiment_id)
 
-        return list(session.exec(statement).all())
+        return list(session.exec(statement))
 
 
 def get_processed_summary_hashes(
     technique: str, db_path: Path, experiment_id: Optional[str] = None
 ) -> List[str]:
     """Get conversation hashes that already have summaries generated for a specific technique"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
-        statement = select(Summary.conversation_hash).where(
-            Summary.technique == technique
+        statement = (
+            select(Summary.conversation_hash)
+            .where(Summary.technique == technique)
+            .distinct()
         )
         if experiment_id:
             statement = statement.where(Summary.experiment_id == experiment_id)
 
-        return list(session.exec(statement).all())
+        return list(session.exec(statement))
 
 
 def filter_unprocessed_hashes(
@@ -400,15 +528,37 @@ def filter_unprocessed_hashes(
     experiment_id: Optional[str] = None,
     is_summary: bool = False,
 ) -> List[str]:
-    """Filter conversation hashes to only include unprocessed ones"""
-    if is_summary:
-        processed_hashes = set(
-            get_processed_summary_hashes(version, db_path, experiment_id)
-        )
-    else:
-        processed_hashes = set(
-            get_processed_question_hashes(version, db_path, experiment_id)
-        )
+    """Filter conversation hashes to only include unprocessed ones
+
+    Only the candidate hashes are looked up, in chunks, so the cost follows the
+    size of this run rather than everything generated so far.
+    """
+    model = Summary if is_summary else Question
+    version_column = Summary.technique if is_summary else Question.version
+    conversation_hashes = list(conversation_hashes)
+    processed_hashes = set()
+
+    engine = get_read_engine(db_path)
+    with Session(engine) as session:
+        for i in range(0, len(conversation_hashes), SQLITE_MAX_VARIABLES):
+            statement = (
+                select(model.conversation_hash)
+                .where(
+                    version_column == version,
+                    model.conversation_hash.in_(
+                        conversation_hashes[i : i + SQLITE_MAX_VARIABLES]
+                    ),
+                )
+                .distinct()
+            )
+            if experiment_id:
+                statement = statement.where(model.experiment_id == experiment_id)
+            # Stream rows straight into the set instead of materializing a list
+            processed_hashes.update(session.exec(statement))
+
+    # Nothing processed yet (the common first run): skip the per-hash lookup
+    if not processed_hashes:
+        return conversation_hashes
 
     return [h for h in conversation_hashes if h not in processed_hashes]
 
@@ -418,17 +568,25 @@ def get_database_stats(db_path: Path) -> Dict[str, int]:
     if not db_path.exists():
         return {}
 
-    engine = get_engine(db_path)
-    stats = {}
+    engine = get_read_engine(db_path)
+    tables = {
+        "conversations": Conversation,
+        "questions": Question,
+        "summaries": Summary,
+        "evaluations": Evaluation,
+    }
 
     with Session(engine) as session:
         from sqlmodel import func
 
-        stats["conversations"] = session.exec(
-            select(func.count(Conversation.conversation_hash))
+        # One round trip: each count is a scalar subquery of a single SELECT
+        counts = session.exec(
+            select(
+                *(
+                    select(func.count()).select_from(model).scalar_subquery()
+                    for model in tables.values()
+                )
+            )
         ).one()
-        stats["questions"] = session.exec(select(func.count(Question.id))).one()
-        stats["summaries"] = session.exec(select(func.count(Summary.id))).one()
-        stats["evaluations"] = session.exec(select(func.count(Evaluation.id))).one()
 
-    return stats
+    return dict(zip(tables, counts))
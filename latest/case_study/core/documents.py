@@ -1,6 +1,6 @@
 from pathlib import Path
 from datasets import load_dataset
-from core.db import setup_database, load_conversations_to_sqlite
+from core.db import setup_database, load_conversations_to_sqlite, analyze_database
 import itertools
 
 
@@ -45,5 +45,6 @@ def load_wildchat_into_db(db_path: Path, limit: int = 10000):
     # Save to database
     inserted_count = load_conversations_to_sqlite(conversations, db_path)
     print(f"Inserted {inserted_count} conversations into database")
+    analyze_database(db_path)
 
     return conversations
@@ -2,7 +2,10 @@
 Embedding generation and management for conversations and summaries.
 """
 
+import asyncio
+from functools import cache
 import numpy as np
+import orjson
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -12,25 +15,53 @@ from rich.console import Console
 from rich.progress import Progress
 import os
 
+from core.cache import GenericCache
+
 console = Console()
 
+# Embeddings are kept as float32 end to end: ChromaDB indexes float32 and
+# local models produce it, so wider floats only cost memory and disk
+EMBEDDING_DTYPE = np.float32
+
+# Default batch sizes when the caller gives none. API batches are sized for
+# request limits; local models sort inputs by length before batching, so
+# larger batches mean less padding
+OPENAI_BATCH_SIZE = 100
+SENTENCE_TRANSFORMER_BATCH_SIZE = 256
+
+
+@cache
+def _load_sentence_transformer(model_name: str, backend: str) -> SentenceTransformer:
+    """Load a sentence-transformers model once per process and share it"""
+    return SentenceTransformer(model_name, backend=backend)
+
 
 class EmbeddingGenerator:
     """Handles embedding generation using different models"""
 
-    def __init__(self, model_name: str = "text-embedding-3-large"):
+    def __init__(
+        self,
+        model_name: str = "text-embedding-3-large",
+        backend: str = "torch",
+        cache: Optional[GenericCache] = None,
+    ):
         """
         Initialize embedding generator
 
         Args:
             model_name: Either an OpenAI model name or a sentence-transformers model
+            backend: Inference backend for sentence-transformers models ("torch",
+                "onnx" or "openvino"); ignored for OpenAI models
+            cache: Optional cache of embeddings keyed by model and text
         """
         self.model_name = model_name
         self.is_openai = model_name.startswith("text-embedding")
+        self._client = None
+        self.cache = cache
 
         if not self.is_openai:
-            # Load sentence-transformers model
-            self.model = SentenceTransformer(model_name)
+            # Load sentence-transformers model, reusing one already loaded
+            self.model = _load_sentence_transformer(model_name, backend)
             self.dimension = self.model.get_sentence_embedding_dimension()
         else:
             # OpenAI models
@@ -45,34 +76,95 @@ class EmbeddingGenerator:
                 raise ValueError(f"Unknown OpenAI model: {model_name}")
 
     async def generate_embeddings(
-        self, texts: List[str], batch_size: int = 100, show_progress: bool = True
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        show_progress: bool = True,
     ) -> np.ndarray:
         """
         Generate embeddings for a list of texts
 
         Args:
             texts: List of texts to embed
-            batch_size: Batch size for processing
+            batch_size: Batch size for processing; defaults to
+                OPENAI_BATCH_SIZE or SENTENCE_TRANSFORMER_BATCH_SIZE
             show_progress: Whether to show progress bar
 
         Returns:
             Numpy array of embeddings
         """
+        if batch_size is None:
+            batch_size = (
+                OPENAI_BATCH_SIZE if self.is_openai else SENTENCE_TRANSFORMER_BATCH_SIZE
+            )
+
+        # Embed each distinct text once and fan the rows back out to every
+        # position it appears in, keeping the output aligned with texts
+        position_by_text = {}
+        for text in texts:
+            position_by_text.setdefault(text, len(position_by_text))
+        unique_texts = list(position_by_text)
+
+        if self.cache is None:
+            embeddings = await self._embed(unique_texts, batch_size, show_progress)
+        else:
+            embeddings = await self._embed_with_cache(
+                unique_texts, batch_size, show_progress
+            )
+
+        if len(unique_texts) == len(texts):
+            return embeddings
+        return embeddings[[position_by_text[text] for text in texts]]
+
+    async def _embed(
+        self, texts: List[str], batch_size: int, show_progress: bool
+    ) -> np.ndarray:
+        """Embed texts with the configured model"""
         if self.is_openai:
             return await self._generate_openai_embeddings(
                 texts, batch_size, show_progress
             )
-        else:
-            return self._generate_sentence_transformer_embeddings(
-                texts, batch_size, show_progress
+        # Local inference is CPU/GPU bound; run it off the event loop
+        return await asyncio.to_thread(
+            self._generate_sentence_transformer_embeddings,
+            texts,
+            batch_size,
+            show_progress,
+        )
+
+    async def _embed_with_cache(
+        self, texts: List[str], batch_size: int, show_progress: bool
+    ) -> np.ndarray:
+        """Embed texts, reusing cached vectors and caching the ones computed"""
+        keys = [GenericCache.make_embedding_key(self.model_name, t) for t in texts]
+        vectors = await asyncio.to_thread(self.cache.get_many, keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in vectors]
+        if missing:
+            embeddings = await self._embed(
+                [texts[i] for i in missing], batch_size, show_progress
             )
+            new_vectors = {keys[i]: row for i, row in zip(missing, embeddings)}
+            await asyncio.to_thread(self.cache.set_many, new_vectors)
+            vectors.update(new_vectors)
+
+        return np.array([vectors[key] for key in keys], dtype=EMBEDDING_DTYPE)
+
+    def _get_client(self) -> AsyncOpenAI:
+        """Lazy load the OpenAI client
+
+        The client is reused across calls so repeated searches share its
+        connection pool instead of opening new connections every time.
+        """
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
 
     async def _generate_openai_embeddings(
         self, texts: List[str], batch_size: int, show_progress: bool
     ) -> np.ndarray:
         """Generate embeddings using OpenAI API"""
-        # Initialize OpenAI client
-        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = self._get_client()
         embeddings = []
 
         if show_progress:
@@ -98,28 +190,18 @@ class EmbeddingGenerator:
                 batch_embeddings = [e.embedding for e in response.data]
                 embeddings.extend(batch_embeddings)
 
-        return np.array(embeddings)
+        return np.array(embeddings, dtype=EMBEDDING_DTYPE)
 
     def _generate_sentence_transformer_embeddings(
         self, texts: List[str], batch_size: int, show_progress: bool
     ) -> np.ndarray:
         """Generate embeddings using sentence-transformers"""
-        if show_progress:
-            embeddings = self.model.encode(
-                texts,
-                batch_size=batch_size,
-                show_progress_bar=True,
-                convert_to_numpy=True,
-            )
-        else:
-            embeddings = self.model.encode(
-                texts,
-                batch_size=batch_size,
-                show_progress_bar=False,
-                convert_to_numpy=True,
-            )
-
-        return embeddings
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress,
+            convert_to_numpy=True,
+        ).astype(EMBEDDING_DTYPE, copy=False)
 
 
 def save_embeddings_to_parquet(
@@ -140,18 +222,15 @@ def save_embeddings_to_parquet(
     # Ensure output directory exists
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Create dataframe
-    df_data = []
-    for i, meta in enumerate(metadata):
-        row = {
-            "id": meta["id"],
-            "embedding": embeddings[i].tolist(),
+    # Create dataframe column-wise: metadata columns come from the dicts, and
+    # embedding rows are handed to pyarrow as arrays rather than Python lists
+    df = pd.DataFrame(
+        {
+            "id": [meta["id"] for meta in metadata],
+            "embedding": list(np.asarray(embeddings, dtype=EMBEDDING_DTYPE)),
             "embedding_model": embedding_model,
-            **{k: v for k, v in meta.items() if k != "id"},
         }
-        df_data.append(row)
-
-    df = pd.DataFrame(df_data)
+    ).join(pd.DataFrame(metadata).drop(columns="id", errors="ignore"))
 
     # Save to parquet
     df.to_parquet(output_path, index=False)
@@ -174,7 +253,7 @@ def load_embeddings_from_parquet(
     df = pd.read_parquet(parquet_path)
 
     # Convert embedding column to numpy array
-    embeddings = np.array(df["embedding"].tolist())
+    embeddings = np.array(df["embedding"].tolist(), dtype=EMBEDDING_DTYPE)
 
     if return_metadata:
         # Return all columns except embedding as metadata
@@ -188,7 +267,8 @@ async def generate_conversation_embeddings(
     conversations: List[Dict[str, Any]],
     embedding_model: str = "text-embedding-3-large",
     output_dir: Path = Path("data/embeddings/conversations"),
-    batch_size: int = 100,
+    batch_size: Optional[int] = None,
+    backend: str = "torch",
 ) -> Path:
     """
     Generate embeddings for conversations and save to parquet
@@ -197,7 +277,9 @@ async def generate_conversation_embeddings(
         conversations: List of conversation dicts (must have 'conversation_hash' and 'text')
         embedding_model: Name of the embedding model to use
         output_dir: Directory to save embeddings
-        batch_size: Batch size for embedding generation
+        batch_size: Batch size for embedding generation; None picks the
+            model's default
+        backend: Inference backend for sentence-transformers models
 
     Returns:
         Path to the saved parquet file
@@ -207,7 +289,7 @@ async def generate_conversation_embeddings(
     )
 
     # Initialize embedding generator
-    generator = EmbeddingGenerator(embedding_model)
+    generator = EmbeddingGenerator(embedding_model, backend=backend)
 
     # Extract texts and metadata, filtering out empty texts
     texts = []
@@ -249,7 +331,8 @@ async def generate_summary_embeddings(
     summaries: List[Dict[str, Any]],
     embedding_model: str = "text-embedding-3-large",
     output_dir: Path = Path("data/embeddings/summaries"),
-    batch_size: int = 100,
+    batch_size: Optional[int] = None,
+    backend: str = "torch",
 ) -> Path:
     """
     Generate embeddings for summaries and save to parquet
@@ -258,7 +341,9 @@ async def generate_summary_embeddings(
         summaries: List of summary dicts (must have 'id', 'summary', 'technique')
         embedding_model: Name of the embedding model to use
         output_dir: Directory to save embeddings
-        batch_size: Batch size for embedding generation
+        batch_size: Batch size for embedding generation; None picks the
+            model's default
+        backend: Inference backend for sentence-transformers models
 
     Returns:
         Path to the saved parquet file
@@ -268,7 +353,7 @@ async def generate_summary_embeddings(
     )
 
     # Initialize embedding generator
-    generator = EmbeddingGenerator(embedding_model)
+    generator = EmbeddingGenerator(embedding_model, backend=backend)
 
     # Extract texts and metadata, filtering out None values
     texts = [s["summary"] for s in summaries]
@@ -335,8 +420,9 @@ async def generate_full_conversation_embeddings(
     conversations: List[Dict[str, Any]],
     embedding_model: str = "text-embedding-3-large",
     output_dir: Path = Path("data/embeddings/full_conversations"),
-    batch_size: int = 100,
+    batch_size: Optional[int] = None,
     max_tokens: int = 8000,
+    backend: str = "torch",
 ) -> Path:
     """
     Generate embeddings for full conversations (not just first message) and save to parquet
@@ -345,8 +431,10 @@ async def generate_full_conversation_embeddings(
         conversations: List of conversation dicts (must have 'conversation_hash' and 'conversation_full')
         embedding_model: Name of the embedding model to use
         output_dir: Directory to save embeddings
-        batch_size: Batch size for embedding generation
+        batch_size: Batch size for embedding generation; None picks the
+            model's default
         max_tokens: Maximum tokens per conversation (will truncate if longer)
+        backend: Inference backend for sentence-transformers models
 
     Returns:
         Path to the saved parquet file
@@ -357,7 +445,7 @@ async def generate_full_conversation_embeddings(
     console.print(f"[yellow]Max tokens per conversation: {max_tokens}[/yellow]")
 
     # Initialize embedding generator
-    generator = EmbeddingGenerator(embedding_model)
+    generator = EmbeddingGenerator(embedding_model, backend=backend)
 
     # Extract texts and metadata, filtering out empty conversations
     texts = []
@@ -369,9 +457,7 @@ async def generate_full_conversation_embeddings(
         # Parse conversation_full JSON string if needed
         if isinstance(conv.get("conversation_full"), str):
             try:
-                import json
-
-                conversation_data = json.loads(conv["conversation_full"])
+                conversation_data = orjson.loads(conv["conversation_full"])
             except Exception:
                 # If not JSON, use as is
                 conversation_data = conv.get("conversation_full", "")
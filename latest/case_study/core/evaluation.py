@@ -2,10 +2,14 @@
 Evaluation metrics and functionality for RAG system.
 """
 
+import asyncio
+import re
+from bisect import bisect_left
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, ClassVar
 from dataclasses import dataclass
-import json
+import numpy as np
+import orjson
 from rich.console import Console
 from rich.table import Table
 from rich.progress import Progress
@@ -13,31 +17,72 @@ from datetime import datetime
 
 from core.db import (
     get_conversations_by_hashes,
+    get_question_columns,
     save_evaluations_to_sqlite,
     save_detailed_evaluation_results,
-    get_engine,
-    Question,
 )
 from core.reranking import get_reranker
 from core.search import VectorSearchEngine
-from sqlmodel import Session, select
 
 console = Console()
 
+# k values reported for recall@k, in ascending order
+K_VALUES = (1, 5, 10, 30)
 
-@dataclass
+# Summary embedding IDs carry a technique suffix, e.g. "<hash>_v1"
+_TECHNIQUE_SUFFIX = re.compile(r"(.+)_(v[1-5])")
+
+
+def _result_conversation_hash(result) -> str:
+    """Get the conversation hash a search result refers to
+
+    Summary embeddings in ChromaDB may have IDs like "hash_v1" while we search
+    for "hash"; the clean conversation_hash is stored in metadata for them.
+    """
+    if "conversation_hash" in result.metadata:
+        return result.metadata["conversation_hash"]
+    match = _TECHNIQUE_SUFFIX.fullmatch(result.id)
+    return match.group(1) if match else result.id
+
+
+@dataclass(slots=True)
 class RecallMetrics:
-    """Recall metrics at different k values"""
+    """Recall metrics at different k values
 
-    recall_at_1: float
-    recall_at_5: float
-    recall_at_10: float
-    recall_at_30: float
+    Hit counts are stored and recall is derived from them, so merging
+    batches is exact.
+    """
+
+    hits_at_1: int
+    hits_at_5: int
+    hits_at_10: int
+    hits_at_30: int
     total_queries: int
     successful_queries: int
 
+    # Maps each k to the field holding its hit count
+    _FIELDS: ClassVar[Dict[int, str]] = {k: f"hits_at_{k}" for k in K_VALUES}
+
+    def get_recall_at_k(self, k: int) -> float:
+        """Get recall for a single k value"""
+        if not self.total_queries:
+            return 0.0
+        return getattr(self, self._FIELDS[k]) / self.total_queries
+
+    def __iadd__(self, other: "RecallMetrics"):
+        """Merge metrics from another batch of queries into this one"""
+        for field_name in self._FIELDS.values():
+            setattr(
+                self,
+                field_name,
+                getattr(self, field_name) + getattr(other, field_name),
+            )
+        self.total_queries += other.total_queries
+        self.successful_queries += other.successful_queries
+        return self
 
-@dataclass
+
+@dataclass(slots=True)
 class EvaluationResult:
     """Single query evaluation result"""
 
@@ -67,36 +112,63 @@ def calculate_recall_at_k(
     if total == 0:
         return {
             "metrics": RecallMetrics(
-                recall_at_1=0.0,
-                recall_at_5=0.0,
-                recall_at_10=0.0,
-                recall_at_30=0.0,
+                hits_at_1=0,
+                hits_at_5=0,
+                hits_at_10=0,
+                hits_at_30=0,
                 total_queries=0,
                 successful_queries=0,
             )
         }
 
-    recalls = {}
-    for k in k_values:
-        found_at_k = sum(
-            1 for r in evaluation_results if r.rank is not None and r.rank <= k
-        )
-        recalls[f"recall_at_{k}"] = found_at_k / total
+    # Bucket every rank into the smallest k it satisfies, then a cumulative sum
+    # gives the hit count for each k in a single pass over the results
+    ks = np.asarray(sorted(k_values))
+    ranks = np.fromiter(
+        (r.rank for r in evaluation_results if r.rank is not None), dtype=np.int64
+    )
+    buckets = np.searchsorted(ks, ranks, side="left")
+    hits = np.bincount(buckets, minlength=len(ks) + 1)[: len(ks)].cumsum()
+
+    hits_by_k = {int(k): int(hits[i]) for i, k in enumerate(ks)}
 
     successful = sum(1 for r in evaluation_results if r.found)
 
     return {
         "metrics": RecallMetrics(
-            recall_at_1=recalls.get("recall_at_1", 0.0),
-            recall_at_5=recalls.get("recall_at_5", 0.0),
-            recall_at_10=recalls.get("recall_at_10", 0.0),
-            recall_at_30=recalls.get("recall_at_30", 0.0),
+            hits_at_1=hits_by_k.get(1, 0),
+            hits_at_5=hits_by_k.get(5, 0),
+            hits_at_10=hits_by_k.get(10, 0),
+            hits_at_30=hits_by_k.get(30, 0),
             total_queries=total,
             successful_queries=successful,
         )
     }
 
 
+def _metric_rows(
+    results: List[EvaluationResult], experiment_id: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Build the per-k recall metric rows saved for each evaluated question"""
+    rows = []
+    id_suffix = experiment_id or "default"
+    for result in results:
+        # Index of the smallest k the rank satisfies; every k from there on
+        # is a hit, so one bisect replaces a comparison per k
+        first_hit = bisect_left(K_VALUES, result.rank) if result.rank else len(K_VALUES)
+        for i, k in enumerate(K_VALUES):
+            rows.append(
+                {
+                    "id": f"{result.question_id}_recall_at_{k}_{id_suffix}",
+                    "question_id": result.question_id,
+                    "metric_name": f"recall_at_{k}",
+                    "metric_value": 1.0 if i >= first_hit else 0.0,
+                    "experiment_id": experiment_id,
+                }
+            )
+    return rows
+
+
 async def evaluate_questions(
     question_version: str,
     embeddings_path: Path,
@@ -131,19 +203,16 @@ async def evaluate_questions(
     """
     console.print(f"[bold green]Evaluating {question_version} questions[/bold green]")
 
-    # Load questions from database
-    engine = get_engine(db_path)
-    with Session(engine) as session:
-        statement = select(Question).where(Question.version == question_version)
-        if limit:
-            statement = statement.limit(limit)
-        questions = session.exec(statement).all()
+    # Load questions from database as parallel columns
+    question_ids, target_hashes, query_texts = get_question_columns(
+        question_version, db_path, limit
+    )
 
-    if not questions:
+    if not question_ids:
         console.print(f"[red]No questions found for version {question_version}[/red]")
         return [], RecallMetrics(0, 0, 0, 0, 0, 0)
 
-    console.print(f"[cyan]Loaded {len(questions)} questions[/cyan]")
+    console.print(f"[cyan]Loaded {len(question_ids)} questions[/cyan]")
 
     # Initialize search engine and reranker
     search_engine = VectorSearchEngine(embeddings_path, embedding_model)
@@ -159,23 +228,50 @@ async def evaluate_questions(
     else:
         initial_top_k = top_k
 
-    # Evaluate each question
-    evaluation_results = []
+    # Group questions by query text so each distinct query is searched once
+    question_indices_by_query: Dict[str, List[int]] = {}
+    for idx, query in enumerate(query_texts):
+        question_indices_by_query.setdefault(query, []).append(idx)
+    unique_queries = list(question_indices_by_query)
+
+    # Evaluate each question, merging per-batch metrics as we go
+    evaluation_results: List[Optional[EvaluationResult]] = [None] * len(question_ids)
+    metrics = RecallMetrics(0, 0, 0, 0, 0, 0)
+    saved = 0
 
     with Progress() as progress:
         task = progress.add_task(
-            f"Evaluating {question_version} questions", total=len(questions)
+            f"Evaluating {question_version} questions", total=len(question_ids)
         )
 
-        # Batch process questions
+        # Batch process unique queries
         batch_size = 100
-        for i in range(0, len(questions), batch_size):
-            batch = questions[i : i + batch_size]
-            queries = [q.question for q in batch]
+        batches = [
+            unique_queries[i : i + batch_size]
+            for i in range(0, len(unique_queries), batch_size)
+        ]
+
+        def embed_batch(queries: List[str]) -> asyncio.Task:
+            return asyncio.create_task(
+                search_engine.embed_queries(queries, show_progress=False)
+            )
+
+        next_embeddings = embed_batch(batches[0]) if batches else None
+        for n, queries in enumerate(batches):
+            query_embeddings = await next_embeddings
+
+            # Start embedding the next batch so it overlaps with this batch's
+            # search, reranking and saving; at most two batches of vectors are
+            # held at a time
+            if n + 1 < len(batches):
+                next_embeddings = embed_batch(batches[n + 1])
 
             # Search for all queries in batch
             search_results = await search_engine.batch_search(
-                queries, top_k=initial_top_k, show_progress=False
+                queries,
+                top_k=initial_top_k,
+                show_progress=False,
+                query_embeddings=query_embeddings,
             )
 
             # Apply reranking if requested
@@ -184,70 +280,49 @@ async def evaluate_questions(
                     queries, search_results, reranker, db_path, target_type, top_k
                 )
 
-            # Process results
-            for question, results in zip(batch, search_results):
-                target_hash = question.conversation_hash
-
-                # Check if target is in results
-                found = False
-                rank = None
-                score = None
-                top_k_hashes = []
-
-                for r in results.results:
-                    # Handle ID format variations between embeddings and summaries
-                    # Summary embeddings in ChromaDB may have IDs like "hash_v1" while we search for "hash"
-                    # The clean conversation_hash is stored in metadata for summaries
-                    result_hash = r.id
-
-                    # First check if metadata contains conversation_hash (for summary embeddings)
-                    if "conversation_hash" in r.metadata:
-                        result_hash = r.metadata["conversation_hash"]
-                    # Otherwise, check if ID has a technique suffix and remove it
-                    elif result_hash.endswith(("_v1", "_v2", "_v3", "_v4", "_v5")):
-                        result_hash = result_hash.rsplit("_", 1)[0]
-
-                    top_k_hashes.append(result_hash)
-                    if result_hash == target_hash:
-                        found = True
-                        rank = r.rank
-                        score = r.score
-
-                eval_result = EvaluationResult(
-                    question_id=question.id,
-                    query=question.question,
-                    target_conversation_hash=target_hash,
-                    found=found,
-                    rank=rank,
-                    score=score,
-                    top_k_results=top_k_hashes[:top_k],
+            # Process results, fanning each query's results out to its questions
+            batch_results = []
+            for query, results in zip(queries, search_results):
+                result_hashes = [_result_conversation_hash(r) for r in results.results]
+                top_k_hashes = result_hashes[:top_k]
+
+                # Map each hash to its result once per query (the last match
+                # wins, as with a full scan) so every question sharing the
+                # query resolves its target with a single lookup
+                result_by_hash = dict(zip(result_hashes, results.results))
+
+                for idx in question_indices_by_query[query]:
+                    target_hash = target_hashes[idx]
+
+                    # Check if target is in results
+                    match = result_by_hash.get(target_hash)
+
+                    eval_result = EvaluationResult(
+                        question_id=question_ids[idx],
+                        query=query,
+                        target_conversation_hash=target_hash,
+                        found=match is not None,
+                        rank=match.rank if match is not None else None,
+                        score=match.score if match is not None else None,
+                        top_k_results=top_k_hashes,
+                    )
+                    evaluation_results[idx] = eval_result
+                    batch_results.append(eval_result)
+
+            metrics += calculate_recall_at_k(batch_results)["metrics"]
+
+            # Save each batch's metrics as soon as it is scored, so rows don't
+            # pile up until the end and an interrupted run keeps its progress
+            if save_results:
+                saved += await asyncio.to_thread(
+                    save_evaluations_to_sqlite,
+                    _metric_rows(batch_results, experiment_id),
+                    db_path,
                 )
-                evaluation_results.append(eval_result)
 
-            progress.update(task, advance=len(batch))
+            progress.update(task, advance=len(batch_results))
 
-    # Calculate metrics
-    metrics_dict = calculate_recall_at_k(evaluation_results)
-    metrics = metrics_dict["metrics"]
-
-    # Save results to database if requested
     if save_results:
-        evaluations = []
-        for result in evaluation_results:
-            for k in [1, 5, 10, 30]:
-                evaluations.append(
-                    {
-                        "id": f"{result.question_id}_recall_at_{k}_{experiment_id or 'default'}",
-                        "question_id": result.question_id,
-                        "metric_name": f"recall_at_{k}",
-                        "metric_value": 1.0
-                        if result.rank and result.rank <= k
-                        else 0.0,
-                        "experiment_id": experiment_id,
-                    }
-                )
-
-        saved = save_evaluations_to_sqlite(evaluations, db_path)
         console.print(f"[green]Saved {saved} evaluation metrics[/green]")
 
     # Print results
@@ -265,10 +340,8 @@ def print_evaluation_results(metrics: RecallMetrics, version: str):
 
     table.add_row("Total Queries", str(metrics.total_queries))
     table.add_row("Successful Queries", str(metrics.successful_queries))
-    table.add_row("Recall@1", f"{metrics.recall_at_1:.2%}")
-    table.add_row("Recall@5", f"{metrics.recall_at_5:.2%}")
-    table.add_row("Recall@10", f"{metrics.recall_at_10:.2%}")
-    table.add_row("Recall@30", f"{metrics.recall_at_30:.2%}")
+    for k in K_VALUES:
+        table.add_row(f"Recall@{k}", f"{metrics.get_recall_at_k(k):.2%}")
 
     console.print(table)
 
@@ -287,21 +360,29 @@ def analyze_failures(
     Returns:
         List of failure analysis dicts
     """
-    failures = [r for r in evaluation_results if not r.found or r.rank > 10]
-
-    if not failures:
+    # Count failures and keep the first top_n in a single pass, without
+    # materializing the full list of failures
+    failure_count = 0
+    failures = []
+    for r in evaluation_results:
+        if not r.found or r.rank > 10:
+            failure_count += 1
+            if len(failures) < top_n:
+                failures.append(r)
+
+    if not failure_count:
         console.print("[green]No failures to analyze![/green]")
         return []
 
-    console.print(f"\n[bold red]Analyzing {len(failures)} failed queries[/bold red]")
+    console.print(f"\n[bold red]Analyzing {failure_count} failed queries[/bold red]")
 
     # Get conversation details for failures
-    failure_hashes = [f.target_conversation_hash for f in failures[:top_n]]
+    failure_hashes = [f.target_conversation_hash for f in failures]
     conversations = get_conversations_by_hashes(failure_hashes, db_path)
     conv_map = {c["conversation_hash"]: c for c in conversations}
 
     failure_analysis = []
-    for failure in failures[:top_n]:
+    for failure in failures:
         conv = conv_map.get(failure.target_conversation_hash, {})
         analysis = {
             "query": failure.query,
@@ -321,6 +402,23 @@ def analyze_failures(
     return failure_analysis
 
 
+@dataclass(slots=True)
+class RerankedResult:
+    """Search result after reranking"""
+
+    id: str
+    score: float
+    rank: int
+    metadata: dict
+
+
+@dataclass
+class RerankedSearchResult:
+    """Reranked results for a single query"""
+
+    results: List[RerankedResult]
+
+
 async def _apply_reranking(
     queries: List[str],
     search_results: List,
@@ -335,98 +433,109 @@ async def _apply_reranking(
         get_summaries_by_hashes_and_technique,
     )
 
-    reranked_results = []
+    # First pass: resolve each query's result hashes (and, for summaries, the
+    # technique) so document text for the whole batch can be fetched at once
+    prepared = []
+    hashes_by_technique: Dict[Optional[str], Dict[str, None]] = {}
 
-    for query, results in zip(queries, search_results):
+    for results in search_results:
         if not results.results:
-            reranked_results.append(results)
+            prepared.append(None)
             continue
 
-        # Extract conversation hashes and get text content
-        doc_info = []
-        conversation_hashes = []
-
-        for r in results.results:
-            # Handle ID format variations
-            result_hash = r.id
-            if "conversation_hash" in r.metadata:
-                result_hash = r.metadata["conversation_hash"]
-            elif result_hash.endswith(("_v1", "_v2", "_v3", "_v4", "_v5")):
-                result_hash = result_hash.rsplit("_", 1)[0]
-
-            conversation_hashes.append(result_hash)
-            doc_info.append((r.id, result_hash, r.score, r.rank))
+        # Extract conversation hashes
+        doc_info = [
+            (r.id, _result_conversation_hash(r), r.score, r.rank)
+            for r in results.results
+        ]
 
-        # Get document text based on target type
         if target_type == "conversations":
-            # Get conversation text
-            conversations = get_conversations_by_hashes(conversation_hashes, db_path)
-            hash_to_text = {c["conversation_hash"]: c["text"] for c in conversations}
+            technique = None
         else:
-            # Get summary text - need to determine technique from metadata or ID
+            # Summary text - need to determine technique from metadata or ID
             technique = None
             if "technique" in results.results[0].metadata:
                 technique = results.results[0].metadata["technique"]
-            elif results.results[0].id.endswith(("_v1", "_v2", "_v3", "_v4", "_v5")):
-                technique = results.results[0].id.split("_")[-1]
+            elif match := _TECHNIQUE_SUFFIX.fullmatch(results.results[0].id):
+                technique = match.group(2)
 
-            if technique:
-                summaries = get_summaries_by_hashes_and_technique(
-                    conversation_hashes, technique, db_path
-                )
-                hash_to_text = {s["conversation_hash"]: s["summary"] for s in summaries}
-            else:
+            if not technique:
                 # Fallback to original ranking if we can't determine technique
-                reranked_results.append(results)
+                prepared.append(None)
                 continue
 
-        # Prepare documents for reranking
+        hashes_by_technique.setdefault(technique, {}).update(
+            dict.fromkeys(conv_hash for _, conv_hash, _, _ in doc_info)
+        )
+        prepared.append((technique, doc_info))
+
+    # Get document text for the whole batch, one query per source
+    text_by_technique: Dict[Optional[str], Dict[str, str]] = {}
+    for technique, hashes in hashes_by_technique.items():
+        if technique is None:
+            conversations = get_conversations_by_hashes(list(hashes), db_path)
+            text_by_technique[technique] = {
+                c["conversation_hash"]: c["text"] for c in conversations
+            }
+        else:
+            summaries = get_summaries_by_hashes_and_technique(
+                list(hashes), technique, db_path
+            )
+            text_by_technique[technique] = {
+                s["conversation_hash"]: s["summary"] for s in summaries
+            }
+
+    # Prepare documents for reranking, keeping the position of each query
+    # that has something to rerank
+    positions = []
+    queries_and_docs = []
+    for i, (query, entry) in enumerate(zip(queries, prepared)):
+        if entry is None:
+            continue
+
+        technique, doc_info = entry
+        hash_to_text = text_by_technique[technique]
+
         documents = []
         for doc_id, conv_hash, score, rank in doc_info:
             text = hash_to_text.get(conv_hash, "")
             if text:
                 documents.append((doc_id, text, score))
 
-        if not documents:
-            reranked_results.append(results)
-            continue
+        if documents:
+            positions.append(i)
+            queries_and_docs.append((query, documents))
 
-        # Apply reranking
-        rerank_results = reranker.rerank(query, documents)
+    # Rerank the whole batch in one call on a worker thread, so inference and
+    # API calls don't block the event loop. Local models score every pair in
+    # one pass and API rerankers send one request at a time, which keeps the
+    # shared model single-threaded and stays under API rate limits.
+    rerank_lists = await asyncio.to_thread(
+        reranker.batch_rerank, queries_and_docs, False
+    )
+
+    reranked_results = list(search_results)
+    for i, rerank_results in zip(positions, rerank_lists):
+        results = search_results[i]
+
+        # Index original metadata by id (first occurrence wins) so mapping
+        # reranked documents back is a lookup rather than a scan per result
+        metadata_by_id = {}
+        for r in results.results:
+            metadata_by_id.setdefault(r.id, r.metadata)
 
         # Convert back to search result format
-        from dataclasses import dataclass
-
-        @dataclass
-        class RerankedResult:
-            id: str
-            score: float
-            rank: int
-            metadata: dict
-
-        @dataclass
-        class RerankedSearchResult:
-            results: List[RerankedResult]
-
-        new_results = []
-        for rerank_result in rerank_results[:final_top_k]:
-            # Find original metadata
-            original_metadata = {}
-            for r in results.results:
-                if r.id == rerank_result.document_id:
-                    original_metadata = r.metadata
-                    break
-
-            new_results.append(
-                RerankedResult(
-                    id=rerank_result.document_id,
-                    score=rerank_result.rerank_score,
-                    rank=rerank_result.reranked_rank,
-                    metadata=original_metadata,
-                )
+        new_results = [
+            RerankedResult(
+                id=rerank_result.document_id,
+                score=rerank_result.rerank_score,
+                rank=rerank_result.reranked_rank,
+                metadata=metadata_by_id.get(rerank_result.document_id, {}),
             )
+            for rerank_result in rerank_results[:final_top_k]
+        ]
 
-        reranked_results.append(RerankedSearchResult(results=new_results))
+        reranked_results[i] = RerankedSearchResult(results=new_results)
 
     return reranked_results
 
@@ -455,10 +564,7 @@ def save_evaluation_report(
     report = {
         "timestamp": datetime.now().isoformat(),
         "metrics": {
-            "recall_at_1": metrics.recall_at_1,
-            "recall_at_5": metrics.recall_at_5,
-            "recall_at_10": metrics.recall_at_10,
-            "recall_at_30": metrics.recall_at_30,
+            **{f"recall_at_{k}": metrics.get_recall_at_k(k) for k in K_VALUES},
             "total_queries": metrics.total_queries,
             "successful_queries": metrics.successful_queries,
         },
@@ -468,8 +574,12 @@ def save_evaluation_report(
 
     # Save to JSON
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, "w") as f:
-        json.dump(report, f, indent=2)
+    with open(output_path, "wb") as f:
+        f.write(
+            orjson.dumps(
+                report, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+            )
+        )
 
     console.print(f"[green]Saved evaluation report to {output_path}[/green]")
 
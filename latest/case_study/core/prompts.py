@@ -0,0 +1,32 @@
+"""
+Shared Jinja environment for the question and summary prompts.
+"""
+
+from textwrap import dedent
+
+from jinja2 import DictLoader, Template
+from jinja2.sandbox import SandboxedEnvironment
+
+# Renders each conversation message; prompts pull it in with
+# {% include "messages" %} so the markup is defined once
+MESSAGES_TEMPLATE = """{% for message in messages %}
+    <message role="{{ message.role }}">
+        {{ message.content }}
+    </message>
+{% endfor %}"""
+
+# Prompt templates are compiled once at import and rendered per call, rather
+# than handing instructor a template string to parse on every request
+TEMPLATES = SandboxedEnvironment(
+    loader=DictLoader({"messages": MESSAGES_TEMPLATE}), keep_trailing_newline=True
+)
+
+
+def compile_prompt(source: str) -> Template:
+    """Compile a prompt so it renders like instructor's templating
+
+    instructor's environment drops one trailing newline from the raw source
+    and dedents the rendered text. Doing both to the source up front gives the
+    same prompt.
+    """
+    return TEMPLATES.from_string(dedent(source.removesuffix("\n")))
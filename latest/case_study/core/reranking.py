@@ -2,9 +2,11 @@
 Reranking functionality for improving retrieval performance.
 """
 
+import threading
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from operator import attrgetter
 from typing import List, Tuple
 import os
 from tqdm import tqdm
@@ -13,8 +15,11 @@ from rich.console import Console
 
 console = Console()
 
+# Sort key for reranked results, shared instead of a new lambda per call
+_BY_RERANK_SCORE = attrgetter("rerank_score")
 
-@dataclass
+
+@dataclass(slots=True)
 class RerankResult:
     """Result from reranking operation"""
 
@@ -62,13 +67,16 @@ class BaseReranker(ABC):
 
     @abstractmethod
     def batch_rerank(
-        self, queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]]
+        self,
+        queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]],
+        show_progress: bool = True,
     ) -> List[List[RerankResult]]:
         """
         Rerank multiple queries in batch
 
         Args:
             queries_and_docs: List of (query, documents) tuples
+            show_progress: Whether to show progress and a latency summary
 
         Returns:
             List of lists containing RerankResult objects for each query
@@ -100,7 +108,9 @@ class NoReranker(BaseReranker):
         return results
 
     def batch_rerank(
-        self, queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]]
+        self,
+        queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]],
+        show_progress: bool = True,
     ) -> List[List[RerankResult]]:
         """Process multiple queries without reranking"""
         return [self.rerank(query, docs) for query, docs in queries_and_docs]
@@ -113,10 +123,16 @@ class SentenceTransformersReranker(BaseReranker):
         super().__init__(f"sentence-transformers/{model_name}")
         self.model_name = model_name
         self._model = None
+        # rerank may be called from several worker threads at once
+        self._load_lock = threading.Lock()
 
     def _load_model(self):
         """Lazy load the model"""
-        if self._model is None:
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
             try:
                 from sentence_transformers import CrossEncoder
 
@@ -146,6 +162,13 @@ class SentenceTransformersReranker(BaseReranker):
         rerank_scores = self._model.predict(query_doc_pairs)
         latency_ms = (time.time() - start_time) * 1000
 
+        return self._rank_by_scores(documents, rerank_scores, latency_ms)
+
+    @staticmethod
+    def _rank_by_scores(
+        documents: List[Tuple[str, str, float]], rerank_scores, latency_ms: float
+    ) -> List[RerankResult]:
+        """Build results for one query's documents, ordered by rerank score"""
         # Create results with original and reranked positions
         results = []
         for i, ((doc_id, doc_text, orig_score), rerank_score) in enumerate(
@@ -158,42 +181,55 @@ class SentenceTransformersReranker(BaseReranker):
                     reranked_rank=0,  # Will be set after sorting
                     original_score=orig_score,
                     rerank_score=float(rerank_score),
+                    # Store latency in results for analysis (no console spam)
+                    latency_ms=latency_ms,
                 )
             )
 
         # Sort by rerank score (descending) and assign new ranks
-        results.sort(key=lambda x: x.rerank_score, reverse=True)
-        for i, result in enumerate(results):
-            result.reranked_rank = i + 1
+        results.sort(key=_BY_RERANK_SCORE, reverse=True)
+        for i, result in enumerate(results, 1):
+            result.reranked_rank = i
 
-        # Store latency in results for analysis (no console spam)
-        for result in results:
-            result.latency_ms = latency_ms
         return results
 
     def batch_rerank(
-        self, queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]]
+        self,
+        queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]],
+        show_progress: bool = True,
     ) -> List[List[RerankResult]]:
-        """Process multiple queries with progress tracking"""
+        """Score every (query, document) pair of the batch in one predict call"""
         if not queries_and_docs:
             return []
 
-        results = []
-        total_queries = len(queries_and_docs)
-        total_latency = 0
+        self._load_model()
 
-        for query, docs in tqdm(
-            queries_and_docs, desc="SentenceTransformers reranking"
-        ):
-            result = self.rerank(query, docs)
-            results.append(result)
-            if result:
-                total_latency += result[0].latency_ms
+        query_doc_pairs = [
+            (query, doc_text)
+            for query, docs in queries_and_docs
+            for doc_id, doc_text, score in docs
+        ]
 
-        avg_latency = total_latency / len(results) if results else 0
-        console.print(
-            f"[green]SentenceTransformers completed {total_queries} queries, avg latency: {avg_latency:.0f}ms[/green]"
+        start_time = time.time()
+        rerank_scores = (
+            self._model.predict(query_doc_pairs, show_progress_bar=show_progress)
+            if query_doc_pairs
+            else []
         )
+        # One call serves every query, so each is charged an equal share
+        latency_ms = (time.time() - start_time) * 1000 / len(queries_and_docs)
+
+        results = []
+        offset = 0
+        for query, docs in queries_and_docs:
+            scores = rerank_scores[offset : offset + len(docs)]
+            offset += len(docs)
+            results.append(self._rank_by_scores(docs, scores, latency_ms))
+
+        if show_progress:
+            console.print(
+                f"[green]SentenceTransformers completed {len(queries_and_docs)} queries, avg latency: {latency_ms:.0f}ms[/green]"
+            )
 
         return results
 
@@ -205,10 +241,16 @@ class CohereReranker(BaseReranker):
         super().__init__("cohere")
         self.model_name = model_name
         self._client = None
+        # rerank may be called from several worker threads at once
+        self._load_lock = threading.Lock()
 
     def _get_client(self):
         """Lazy load the Cohere client"""
-        if self._client is None:
+        if self._client is not None:
+            return self._client
+        with self._load_lock:
+            if self._client is not None:
+                return self._client
             try:
                 import cohere
 
@@ -254,30 +296,22 @@ class CohereReranker(BaseReranker):
             # Fall back to original ranking
             return self._fallback_to_original(documents)
 
-        # Create results mapping
-        results = []
-        reranked_indices = [result.index for result in response.results]
-        reranked_scores = [result.relevance_score for result in response.results]
-
         # Build mapping from original position to reranked position
-        for new_rank, (orig_idx, rerank_score) in enumerate(
-            zip(reranked_indices, reranked_scores), 1
-        ):
-            doc_id, doc_text, orig_score = documents[orig_idx]
+        results = []
+        for new_rank, result in enumerate(response.results, 1):
+            doc_id, doc_text, orig_score = documents[result.index]
             results.append(
                 RerankResult(
                     document_id=doc_id,
-                    original_rank=orig_idx + 1,
+                    original_rank=result.index + 1,
                     reranked_rank=new_rank,
                     original_score=orig_score,
-                    rerank_score=rerank_score,
+                    rerank_score=result.relevance_score,
+                    # Store latency in results for analysis (no console spam)
+                    latency_ms=latency_ms,
                 )
             )
 
-        # Store latency in results for analysis (no console spam)
-        for result in results:
-            result.latency_ms = latency_ms
-
         return results
 
     def _fallback_to_original(
@@ -298,9 +332,11 @@ class CohereReranker(BaseReranker):
         return results
 
     def batch_rerank(
-        self, queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]]
+        self,
+        queries_and_docs: List[Tuple[str, List[Tuple[str, str, float]]]],
+        show_progress: bool = True,
     ) -> List[List[RerankResult]]:
-        """Process multiple queries with progress tracking"""
+        """Process multiple queries one request at a time, staying under rate limits"""
         if not queries_and_docs:
             return []
 
@@ -308,16 +344,19 @@ class CohereReranker(BaseReranker):
         total_queries = len(queries_and_docs)
         total_latency = 0
 
-        for query, docs in tqdm(queries_and_docs, desc="Cohere reranking"):
+        for query, docs in tqdm(
+            queries_and_docs, desc="Cohere reranking", disable=not show_progress
+        ):
             result = self.rerank(query, docs)
             results.append(result)
             if result:
                 total_latency += result[0].latency_ms
 
-        avg_latency = total_latency / len(results) if results else 0
-        console.print(
-            f"[green]Cohere completed {total_queries} queries, avg latency: {avg_latency:.0f}ms[/green]"
-        )
+        if show_progress:
+            avg_latency = total_latency / len(results) if results else 0
+            console.print(
+                f"[green]Cohere completed {total_queries} queries, avg latency: {avg_latency:.0f}ms[/green]"
+            )
 
         return results
 
@@ -2,18 +2,46 @@
 Search functionality for finding similar conversations using embeddings with ChromaDB.
 """
 
+import asyncio
 import chromadb
+import numpy as np
+from functools import cache
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 
+from core.cache import GenericCache
 from core.embeddings import EmbeddingGenerator, load_embeddings_from_parquet
 from rich.console import Console
 
 console = Console()
 
+# Only the fields results are built from; documents are never stored or read
+QUERY_INCLUDE = ["metadatas", "distances"]
 
-@dataclass
+
+def _to_chroma_metadata_value(value: Any) -> Any:
+    """Convert a metadata value to a type ChromaDB accepts"""
+    # Convert timestamps to strings
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    # Convert numpy types to Python types
+    if hasattr(value, "item"):
+        return value.item()
+    # Keep None, str, int, float, bool as is
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # Convert everything else to string
+    return str(value)
+
+
+@cache
+def _get_persistent_client(path: str):
+    """Get a shared ChromaDB client for a persist directory"""
+    return chromadb.PersistentClient(path=path)
+
+
+@dataclass(slots=True)
 class SearchResult:
     """Single search result"""
 
@@ -41,6 +69,7 @@ class ChromaSearchEngine:
         collection_name: str,
         embedding_model: str = "text-embedding-3-large",
         persist_directory: Optional[Path] = None,
+        query_cache_dir: Optional[Path] = None,
     ):
         """
         Initialize search engine with ChromaDB
@@ -49,13 +78,14 @@ class ChromaSearchEngine:
             collection_name: Name of the ChromaDB collection
             embedding_model: Model used for query embedding
             persist_directory: Directory to persist ChromaDB data
+            query_cache_dir: Optional directory to cache query embeddings in
         """
         self.collection_name = collection_name
         self.embedding_model = embedding_model
 
         # Initialize ChromaDB client
         if persist_directory:
-            self.client = chromadb.PersistentClient(path=str(persist_directory))
+            self.client = _get_persistent_client(str(persist_directory))
         else:
             self.client = chromadb.Client()
 
@@ -65,7 +95,8 @@ class ChromaSearchEngine:
         )
 
         # Initialize query embedder
-        self.query_embedder = EmbeddingGenerator(embedding_model)
+        query_cache = GenericCache(query_cache_dir) if query_cache_dir else None
+        self.query_embedder = EmbeddingGenerator(embedding_model, cache=query_cache)
 
         console.print(
             f"[green]ChromaDB search engine initialized for collection: {collection_name}[/green]"
@@ -84,24 +115,12 @@ class ChromaSearchEngine:
         ids = metadata_df["id"].tolist()
         embeddings_list = embeddings.tolist()
 
-        # Convert metadata to ChromaDB-compatible format
-        metadatas = []
-        for _, row in metadata_df.iterrows():
-            meta = {}
-            for key, value in row.items():
-                # Convert timestamps to strings
-                if hasattr(value, "isoformat"):
-                    meta[key] = value.isoformat()
-                # Convert numpy types to Python types
-                elif hasattr(value, "item"):
-                    meta[key] = value.item()
-                # Keep None, str, int, float, bool as is
-                elif value is None or isinstance(value, (str, int, float, bool)):
-                    meta[key] = value
-                else:
-                    # Convert everything else to string
-                    meta[key] = str(value)
-            metadatas.append(meta)
+        # Convert metadata to ChromaDB-compatible format, reading rows as plain
+        # dicts rather than building a Series per row with iterrows
+        metadatas = [
+            {key: _to_chroma_metadata_value(value) for key, value in row.items()}
+            for row in metadata_df.to_dict("records")
+        ]
 
         # Add to collection in batches
         batch_size = 100
@@ -141,8 +160,12 @@ class ChromaSearchEngine:
 
         # Search in ChromaDB
         search_start = time.time()
-        results = self.collection.query(
-            query_embeddings=[query_embedding], n_results=top_k, where=where
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[query_embedding],
+            n_results=top_k,
+            where=where,
+            include=QUERY_INCLUDE,
         )
         search_time = (time.time() - search_start) * 1000
 
@@ -177,6 +200,7 @@ class ChromaSearchEngine:
         top_k: int = 10,
         where: Optional[Dict[str, Any]] = None,
         show_progress: bool = True,
+        query_embeddings: Optional[np.ndarray] = None,
     ) -> List[SearchResults]:
         """
         Search for multiple queries
@@ -186,19 +210,23 @@ class ChromaSearchEngine:
             top_k: Number of results per query
             where: Optional filter conditions
             show_progress: Whether to show progress
+            query_embeddings: Precomputed embeddings for the queries, if any
 
         Returns:
             List of SearchResults
         """
-        # Generate all query embeddings at once
-        query_embeddings = await self.query_embedder.generate_embeddings(
-            queries, show_progress=show_progress
-        )
+        # Generate all query embeddings at once unless they were precomputed
+        if query_embeddings is None:
+            query_embeddings = await self.embed_queries(queries, show_progress)
         query_embeddings_list = query_embeddings.tolist()
 
-        # Search for all queries
-        results = self.collection.query(
-            query_embeddings=query_embeddings_list, n_results=top_k, where=where
+        # Search for all queries off the event loop; the Chroma client is sync
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=query_embeddings_list,
+            n_results=top_k,
+            where=where,
+            include=QUERY_INCLUDE,
         )
 
         # Convert to SearchResults objects
@@ -233,6 +261,14 @@ class ChromaSearchEngine:
 
         return all_results
 
+    async def embed_queries(
+        self, queries: List[str], show_progress: bool = True
+    ) -> np.ndarray:
+        """Embed queries with the model used for search"""
+        return await self.query_embedder.generate_embeddings(
+            queries, show_progress=show_progress
+        )
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the collection"""
         count = self.collection.count()
@@ -258,12 +294,22 @@ class VectorSearchEngine:
             collection_name=collection_name,
             embedding_model=embedding_model,
             persist_directory=persist_dir,
+            # Queries repeat across runs, so reuse their embeddings
+            query_cache_dir=embeddings_path.parent.parent
+            / "cache"
+            / "query_embeddings",
         )
 
         # Check if we need to load embeddings
         if self.engine.collection.count() == 0:
             self.engine.load_embeddings_from_parquet(embeddings_path)
 
+    async def embed_queries(
+        self, queries: List[str], show_progress: bool = True
+    ) -> np.ndarray:
+        """Embed queries with the model used for search"""
+        return await self.engine.embed_queries(queries, show_progress)
+
     async def search(
         self, query: str, top_k: int = 10, min_score: Optional[float] = None
     ) -> SearchResults:
@@ -284,10 +330,14 @@ class VectorSearchEngine:
         top_k: int = 10,
         min_score: Optional[float] = None,
         show_progress: bool = True,
+        query_embeddings: Optional[np.ndarray] = None,
     ) -> List[SearchResults]:
         """Batch search compatibility method"""
         all_results = await self.engine.batch_search(
-            queries, top_k, show_progress=show_progress
+            queries,
+            top_k,
+            show_progress=show_progress,
+            query_embeddings=query_embeddings,
         )
 
         # Filter by min_score if provided
@@ -1,8 +1,13 @@
 from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from instructor import OpenAISchema
+from pydantic import Field
 
+from core.prompts import compile_prompt
 
-class ConversationSummary(BaseModel):
+
+# Subclassing OpenAISchema lets instructor use the model as-is instead of
+# deriving a new wrapper model from it on every request
+class ConversationSummary(OpenAISchema):
     """Generated summary of a conversation."""
 
     chain_of_thought: str = Field(
@@ -13,6 +18,29 @@ class ConversationSummary(BaseModel):
     )
 
 
+_SUMMARY_PROMPT_V1 = compile_prompt(
+    """
+    You are creating search-optimized summaries of conversations for a RAG system.
+    Your goal is to summarize this conversation in a way that makes it easily discoverable
+    through semantic search.
+    
+    Generate a 2-3 sentence summary that:
+    1. Captures the main topic or problem discussed
+    2. Includes key technical terms, concepts, or domain-specific vocabulary
+    3. Mentions the type of assistance provided (explanation, troubleshooting, code example, etc.)
+    4. Uses natural language that someone might use when searching
+    
+    Focus on WHAT the conversation is about, not HOW it progresses.
+    
+    <conversation>
+    {% include "messages" %}
+    </conversation>
+    
+    Generate a concise, searchable summary of this conversation.
+    """
+)
+
+
 async def conversation_summary_v1(
     client,  # instructor-patched client
     messages: List[Dict[str, Any]],
@@ -37,68 +65,19 @@ async def conversation_summary_v1(
         ConversationSummary object with concise, search-optimized summary
     """
 
-    prompt = """
-    You are creating search-optimized summaries of conversations for a RAG system.
-    Your goal is to summarize this conversation in a way that makes it easily discoverable
-    through semantic search.
-    
-    Generate a 2-3 sentence summary that:
-    1. Captures the main topic or problem discussed
-    2. Includes key technical terms, concepts, or domain-specific vocabulary
-    3. Mentions the type of assistance provided (explanation, troubleshooting, code example, etc.)
-    4. Uses natural language that someone might use when searching
-    
-    Focus on WHAT the conversation is about, not HOW it progresses.
-    
-    <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
-    </conversation>
-    
-    Generate a concise, searchable summary of this conversation.
-    """
+    prompt = _SUMMARY_PROMPT_V1.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=ConversationSummary,
         messages=[{"role": "user", "content": prompt}],
-        context={"messages": messages},
         max_retries=3,
     )
 
     return response
 
 
-async def conversation_summary_v2(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> ConversationSummary:
-    """
-    Generate a comprehensive summary that captures conversation patterns, themes, and user interaction dynamics.
-
-    This approach creates summaries that capture:
-    - Conversation patterns and interaction types
-    - User intent, behavior, and preferences
-    - AI response characteristics and adjustments
-    - Overall conversation flow and structure
-    - User feedback and emotional context
-    - Knowledge requests and learning progression
-    - User Satisfaction and Frustration Points
-
-    The summary should be detailed enough to match pattern-based queries and understand
-    the full context of user-AI interaction dynamics.
-
-    Args:
-        client: instructor-patched client
-        messages: List of conversation messages
-
-    Returns:
-        ConversationSummary object with comprehensive, pattern-focused summary
+_SUMMARY_PROMPT_V2 = compile_prompt(
     """
-
-    prompt = """
 Your task is to create a detailed summary of the conversation, paying close attention to the user's explicit requests, feedback, and the assistant's responses.
 This summary should be thorough in capturing key topics, important details, interaction patterns, and user preferences that would be essential for understanding the conversation's context and continuation.
 
@@ -271,12 +250,39 @@ Here's an example of how your output should be structured:
 
 Please provide your summary based on the conversation so far, following this structure and ensuring precision and thoroughness in your response.
 
-{% for message in messages %}
-    <message role="{{ message.role }}">
-        {{ message.content }}
-    </message>
-{% endfor %}
+{% include "messages" %}
+    """
+)
+
+
+async def conversation_summary_v2(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> ConversationSummary:
     """
+    Generate a comprehensive summary that captures conversation patterns, themes, and user interaction dynamics.
+
+    This approach creates summaries that capture:
+    - Conversation patterns and interaction types
+    - User intent, behavior, and preferences
+    - AI response characteristics and adjustments
+    - Overall conversation flow and structure
+    - User feedback and emotional context
+    - Knowledge requests and learning progression
+    - User Satisfaction and Frustration Points
+
+    The summary should be detailed enough to match pattern-based queries and understand
+    the full context of user-AI interaction dynamics.
+
+    Args:
+        client: instructor-patched client
+        messages: List of conversation messages
+
+    Returns:
+        ConversationSummary object with comprehensive, pattern-focused summary
+    """
+
+    prompt = _SUMMARY_PROMPT_V2.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=ConversationSummary,
@@ -287,39 +293,14 @@ Please provide your summary based on the conversation so far, following this str
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
         max_retries=3,
     )
 
     return response
 
 
-async def conversation_summary_v3(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> ConversationSummary:
+_SUMMARY_PROMPT_V3 = compile_prompt(
     """
-    Generate a concise pattern-focused summary that bridges content and patterns.
-
-    This approach creates 3-5 sentence summaries that capture:
-    - Conversation type and category
-    - Main interaction pattern
-    - Key topics with pattern context
-    - User intent category
-    - Notable characteristics
-
-    The summary balances brevity with pattern recognition, making it useful
-    for both content and pattern-based searches.
-
-    Args:
-        client: instructor-patched client
-        messages: List of conversation messages
-
-    Returns:
-        ConversationSummary object with concise pattern-aware summary
-    """
-
-    prompt = """
 You are creating balanced summaries that capture both content and conversation patterns.
 
 Generate a 3-5 sentence summary that includes:
@@ -351,15 +332,40 @@ Generate a 3-5 sentence summary that includes:
 Focus on creating a summary that works for BOTH content searches AND pattern searches.
 
 <conversation>
-{% for message in messages %}
-    <message role="{{ message.role }}">
-        {{ message.content }}
-    </message>
-{% endfor %}
+{% include "messages" %}
 </conversation>
 
 Generate a concise, pattern-aware summary that balances content and conversation dynamics.
     """
+)
+
+
+async def conversation_summary_v3(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> ConversationSummary:
+    """
+    Generate a concise pattern-focused summary that bridges content and patterns.
+
+    This approach creates 3-5 sentence summaries that capture:
+    - Conversation type and category
+    - Main interaction pattern
+    - Key topics with pattern context
+    - User intent category
+    - Notable characteristics
+
+    The summary balances brevity with pattern recognition, making it useful
+    for both content and pattern-based searches.
+
+    Args:
+        client: instructor-patched client
+        messages: List of conversation messages
+
+    Returns:
+        ConversationSummary object with concise pattern-aware summary
+    """
+
+    prompt = _SUMMARY_PROMPT_V3.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=ConversationSummary,
@@ -370,39 +376,14 @@ Generate a concise, pattern-aware summary that balances content and conversation
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
         max_retries=3,
     )
 
     return response
 
 
-async def conversation_summary_v4(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> ConversationSummary:
-    """
-    Generate a pattern-focused summary optimized for v2-style queries.
-
-    This approach creates summaries that explicitly capture:
-    - Conversation categorization and type
-    - Interaction patterns and dynamics
-    - Domain and thematic classification
-    - User behavior patterns
-    - AI response patterns
-    - Meta-conversation characteristics
-
-    The summary uses pattern-descriptive language that aligns with v2 query style.
-
-    Args:
-        client: instructor-patched client
-        messages: List of conversation messages
-
-    Returns:
-        ConversationSummary object with pattern-optimized summary
+_SUMMARY_PROMPT_V4 = compile_prompt(
     """
-
-    prompt = """
 You are a conversation analyst creating searchable summaries that capture conversation PATTERNS and TYPES, not just content details.
 
 Your goal is to create a summary that would match pattern-based search queries like:
@@ -451,15 +432,40 @@ Analyze this conversation and create a structured summary with these components:
 Remember: Focus on HOW the conversation unfolds and WHAT TYPE it represents, not just WHAT was discussed.
 
 <conversation>
-{% for message in messages %}
-    <message role="{{ message.role }}">
-        {{ message.content }}
-    </message>
-{% endfor %}
+{% include "messages" %}
 </conversation>
 
 Generate a pattern-focused summary that would be discoverable by researchers looking for specific conversation types and interaction patterns.
 """
+)
+
+
+async def conversation_summary_v4(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> ConversationSummary:
+    """
+    Generate a pattern-focused summary optimized for v2-style queries.
+
+    This approach creates summaries that explicitly capture:
+    - Conversation categorization and type
+    - Interaction patterns and dynamics
+    - Domain and thematic classification
+    - User behavior patterns
+    - AI response patterns
+    - Meta-conversation characteristics
+
+    The summary uses pattern-descriptive language that aligns with v2 query style.
+
+    Args:
+        client: instructor-patched client
+        messages: List of conversation messages
+
+    Returns:
+        ConversationSummary object with pattern-optimized summary
+    """
+
+    prompt = _SUMMARY_PROMPT_V4.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=ConversationSummary,
@@ -470,40 +476,14 @@ Generate a pattern-focused summary that would be discoverable by researchers loo
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
         max_retries=3,
     )
 
     return response
 
 
-async def conversation_summary_v5(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> ConversationSummary:
-    """
-    Generate summaries optimized for AI agent failure analysis and improvement identification.
-
-    This approach creates summaries that capture:
-    - Root causes of AI failures and misunderstandings
-    - User impact and satisfaction metrics
-    - Recovery patterns and resolution strategies
-    - Capability gaps and improvement opportunities
-    - Success patterns that can be replicated
-    - Metadata for prioritizing improvements
-
-    The summary is structured to enable an AI agent to identify patterns across conversations
-    and propose data-driven improvements.
-
-    Args:
-        client: instructor-patched client
-        messages: List of conversation messages
-
-    Returns:
-        ConversationSummary object with analysis-optimized summary
+_SUMMARY_PROMPT_V5 = compile_prompt(
     """
-
-    prompt = """
     Create a hybrid summary that excels at both pattern-based (v2) and content-based (v1) search queries.
 
     CRITICAL: Balance these two needs:
@@ -529,15 +509,41 @@ async def conversation_summary_v5(
     Balance pattern description with content keywords. Be specific and searchable.
     
     <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
+    {% include "messages" %}
     </conversation>
     
     Generate a balanced summary optimized for both pattern and content queries.
     """
+)
+
+
+async def conversation_summary_v5(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> ConversationSummary:
+    """
+    Generate summaries optimized for AI agent failure analysis and improvement identification.
+
+    This approach creates summaries that capture:
+    - Root causes of AI failures and misunderstandings
+    - User impact and satisfaction metrics
+    - Recovery patterns and resolution strategies
+    - Capability gaps and improvement opportunities
+    - Success patterns that can be replicated
+    - Metadata for prioritizing improvements
+
+    The summary is structured to enable an AI agent to identify patterns across conversations
+    and propose data-driven improvements.
+
+    Args:
+        client: instructor-patched client
+        messages: List of conversation messages
+
+    Returns:
+        ConversationSummary object with analysis-optimized summary
+    """
+
+    prompt = _SUMMARY_PROMPT_V5.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=ConversationSummary,
@@ -548,7 +554,6 @@ async def conversation_summary_v5(
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
         max_retries=3,
     )
 
@@ -1,8 +1,13 @@
 from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from instructor import OpenAISchema
+from pydantic import Field
 
+from core.prompts import compile_prompt
 
-class SearchQueries(BaseModel):
+
+# Subclassing OpenAISchema lets instructor use the model as-is instead of
+# deriving a new wrapper model from it on every request
+class SearchQueries(OpenAISchema):
     """Generated search queries that could lead to discovering a conversation."""
 
     chain_of_thought: str = Field(
@@ -15,26 +20,8 @@ class SearchQueries(BaseModel):
     )
 
 
-async def synthetic_question_generation_v1(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> SearchQueries:
+_QUESTION_PROMPT_V1 = compile_prompt(
     """
-    Generate diverse synthetic search queries from a chat conversation.
-
-    As a product manager analyzing ChatGPT usage patterns, this function creates
-    search queries that users might have typed to discover similar conversations.
-    The queries should be diverse and cover different aspects of the conversation.
-
-    Args:
-        client: instructor-patched client
-        conversation: Dictionary containing conversation data with 'messages' or 'conversation' key
-
-    Returns:
-        SearchQueries object with 4-5 diverse search queries and reasoning
-    """
-
-    prompt = """
     You are a product manager analyzing ChatGPT usage patterns. Your goal is to understand 
     how users might search to find conversations like this one.
     
@@ -48,46 +35,45 @@ async def synthetic_question_generation_v1(
     5. Include both question-style and keyword-style queries
     
     <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
+    {% include "messages" %}
     </conversation>
     
     Generate queries that would realistically lead someone to discover this conversation.
     """
-
-    response = await client.chat.completions.create(
-        response_model=SearchQueries,
-        messages=[{"role": "user", "content": prompt}],
-        context={"messages": messages},
-    )
-
-    return response
+)
 
 
-async def synthetic_question_generation_v2(
+async def synthetic_question_generation_v1(
     client,  # instructor-patched client
     messages: List[Dict[str, Any]],
 ) -> SearchQueries:
     """
-    Generate search queries for finding conversations with similar patterns and characteristics.
+    Generate diverse synthetic search queries from a chat conversation.
 
-    This version focuses on identifying conversation types, themes, and patterns that would be
-    useful for researchers, content moderators, or analysts studying human-AI interactions.
+    As a product manager analyzing ChatGPT usage patterns, this function creates
+    search queries that users might have typed to discover similar conversations.
+    The queries should be diverse and cover different aspects of the conversation.
 
     Args:
         client: instructor-patched client
-        conversation_id: ID of the conversation to analyze
         conversation: Dictionary containing conversation data with 'messages' or 'conversation' key
-        conversation_hash: Unique hash of the conversation for caching
 
     Returns:
-        SearchQueries object with pattern-focused search queries
+        SearchQueries object with 4-5 diverse search queries and reasoning
     """
 
-    prompt = """
+    prompt = _QUESTION_PROMPT_V1.render(messages=messages)
+
+    response = await client.chat.completions.create(
+        response_model=SearchQueries,
+        messages=[{"role": "user", "content": prompt}],
+    )
+
+    return response
+
+
+_QUESTION_PROMPT_V2 = compile_prompt(
+    """
     You are a research analyst studying patterns in human-AI conversations from the WildChat dataset.
     Your goal is to identify the key characteristics and patterns in this conversation that would help
     researchers find similar types of conversations.
@@ -111,17 +97,37 @@ async def synthetic_question_generation_v2(
     - "educational Q&A about scientific concepts"
     
     <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
+    {% include "messages" %}
     </conversation>
     
     Generate 5-7 search queries that focus on conversation patterns, themes, and characteristics
     rather than specific content details. Think about what makes this conversation type distinct
     and how researchers would categorize it.
     """
+)
+
+
+async def synthetic_question_generation_v2(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> SearchQueries:
+    """
+    Generate search queries for finding conversations with similar patterns and characteristics.
+
+    This version focuses on identifying conversation types, themes, and patterns that would be
+    useful for researchers, content moderators, or analysts studying human-AI interactions.
+
+    Args:
+        client: instructor-patched client
+        conversation_id: ID of the conversation to analyze
+        conversation: Dictionary containing conversation data with 'messages' or 'conversation' key
+        conversation_hash: Unique hash of the conversation for caching
+
+    Returns:
+        SearchQueries object with pattern-focused search queries
+    """
+
+    prompt = _QUESTION_PROMPT_V2.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=SearchQueries,
@@ -132,34 +138,13 @@ async def synthetic_question_generation_v2(
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
     )
 
     return response
 
 
-async def synthetic_question_generation_v3(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> SearchQueries:
-    """
-    Generate highly specific search queries that balance pattern recognition with unique details.
-
-    This version creates queries that:
-    - Maintain awareness of conversation patterns and types
-    - Include specific distinguishing details
-    - Capture customer satisfaction/frustration signals
-    - Are specific enough to find individual conversations
-
-    Args:
-        client: instructor-patched client
-        messages: List of conversation messages
-
-    Returns:
-        SearchQueries object with specific, pattern-aware search queries
+_QUESTION_PROMPT_V3 = compile_prompt(
     """
-
-    prompt = """
     You are a search optimization specialist analyzing conversations from the WildChat dataset.
     Your goal is to create search queries that would uniquely identify THIS SPECIFIC conversation
     while maintaining awareness of its patterns and characteristics.
@@ -202,16 +187,37 @@ async def synthetic_question_generation_v3(
     among thousands of similar ones, while still being natural search queries.
     
     <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
+    {% include "messages" %}
     </conversation>
     
     Generate queries that uniquely identify this conversation while capturing its patterns,
     user satisfaction level, and distinguishing features.
     """
+)
+
+
+async def synthetic_question_generation_v3(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> SearchQueries:
+    """
+    Generate highly specific search queries that balance pattern recognition with unique details.
+
+    This version creates queries that:
+    - Maintain awareness of conversation patterns and types
+    - Include specific distinguishing details
+    - Capture customer satisfaction/frustration signals
+    - Are specific enough to find individual conversations
+
+    Args:
+        client: instructor-patched client
+        messages: List of conversation messages
+
+    Returns:
+        SearchQueries object with specific, pattern-aware search queries
+    """
+
+    prompt = _QUESTION_PROMPT_V3.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=SearchQueries,
@@ -222,19 +228,13 @@ async def synthetic_question_generation_v3(
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
     )
 
     return response
 
 
-async def synthetic_question_generation_v5(
-    client,  # instructor-patched client
-    messages: List[Dict[str, Any]],
-) -> SearchQueries:
-    """Generate queries optimized for AI agent analysis of system failures and improvements."""
-
-    prompt = """
+_QUESTION_PROMPT_V5 = compile_prompt(
+    """
     Analyze this conversation and generate 5-7 search queries that an AI analysis agent would use 
     to find similar patterns for system improvement. Your queries should help identify:
     
@@ -271,15 +271,21 @@ async def synthetic_question_generation_v5(
     - Potential improvement direction
     
     <conversation>
-    {% for message in messages %}
-        <message role="{{ message.role }}">
-            {{ message.content }}
-        </message>
-    {% endfor %}
+    {% include "messages" %}
     </conversation>
     
     Generate queries that would help an AI agent identify systemic issues and improvement opportunities.
     """
+)
+
+
+async def synthetic_question_generation_v5(
+    client,  # instructor-patched client
+    messages: List[Dict[str, Any]],
+) -> SearchQueries:
+    """Generate queries optimized for AI agent analysis of system failures and improvements."""
+
+    prompt = _QUESTION_PROMPT_V5.render(messages=messages)
 
     response = await client.chat.completions.create(
         response_model=SearchQueries,
@@ -290,7 +296,6 @@ async def synthetic_question_generation_v5(
             },
             {"role": "user", "content": prompt},
         ],
-        context={"messages": messages},
     )
 
     return response
@@ -1,14 +1,16 @@
 import asyncio
 import typer
+from enum import Enum
 from pathlib import Path
 from typing import List, Optional
 from rich.console import Console
 
-from core.db import get_engine, get_conversations_by_hashes, get_database_stats, Summary
+from core.db import get_read_engine, get_conversations, get_database_stats, Summary
 from core.documents import load_wildchat_into_db
 from pipelines.generation import (
     generate_questions_pipeline,
     generate_summaries_pipeline,
+    create_client,
 )
 from core.embeddings import (
     generate_conversation_embeddings,
@@ -24,19 +26,45 @@ console = Console()
 app = typer.Typer()
 
 
+class QuestionVersion(str, Enum):
+    """Question generation prompt versions"""
+
+    v1 = "v1"
+    v2 = "v2"
+    v3 = "v3"
+    v5 = "v5"
+
+
+class SummaryVersion(str, Enum):
+    """Summary generation prompt versions"""
+
+    v1 = "v1"
+    v2 = "v2"
+    v3 = "v3"
+    v4 = "v4"
+    v5 = "v5"
+
+
+class EmbeddingBackend(str, Enum):
+    """Inference backends for local sentence-transformers models"""
+
+    torch = "torch"
+    onnx = "onnx"
+    openvino = "openvino"
+
+
 def get_all_conversation_hashes(
     db_path: Path, limit: Optional[int] = None
 ) -> List[str]:
     """Get all conversation hashes from the database"""
-    engine = get_engine(db_path)
+    engine = get_read_engine(db_path)
 
     with Session(engine) as session:
         statement = select(Conversation.conversation_hash)
         if limit:
             statement = statement.limit(limit)
 
-        results = session.exec(statement).all()
-        return list(results)
+        return list(session.exec(statement))
 
 
 @app.command()
@@ -49,8 +77,8 @@ def load_wildchat(
 
 @app.command()
 def generate_questions(
-    version: str = typer.Option(
-        "v1", help="Question generation version (v1, v2, v3, v5)"
+    version: QuestionVersion = typer.Option(
+        QuestionVersion.v1, help="Question generation version"
     ),
     limit: Optional[int] = typer.Option(
         None, help="Limit number of conversations to process"
@@ -65,13 +93,8 @@ def generate_questions(
 ):
     """Generate synthetic questions for conversations"""
 
-    # Validate version
-    valid_versions = ["v1", "v2", "v3", "v5"]
-    if version not in valid_versions:
-        console.print(
-            f"[red]Error: Invalid version '{version}'. Must be one of: {valid_versions}[/red]"
-        )
-        raise typer.Exit(1)
+    # typer has already validated the choice; work with the plain string
+    version = version.value
 
     # Get conversation hashes
     if conversation_hashes:
@@ -120,12 +143,12 @@ def generate_summaries(
 ):
     """Generate summaries for conversations using one or more versions"""
 
-    # Parse versions
-    valid_versions = ["v1", "v2", "v3", "v4", "v5"]
+    # Parse versions once, dropping duplicates so no version runs twice
+    valid_versions = [v.value for v in SummaryVersion]
     if versions.lower() == "all":
         version_list = valid_versions
     else:
-        version_list = [v.strip() for v in versions.split(",")]
+        version_list = list(dict.fromkeys(v.strip() for v in versions.split(",")))
 
     # Validate versions
     for version in version_list:
@@ -152,18 +175,25 @@ def generate_summaries(
     # Run the generation pipeline for each version
     all_results = {}
 
+    # Divide concurrency among versions, handing out the remainder so the full
+    # budget is used, and give every version at least one worker
+    per_version, extra = divmod(concurrency, len(version_list))
+
     async def run_all_versions():
+        # One client for every version, so they share a connection pool
+        # instead of each opening its own connections to the API
+        client = create_client()
         tasks = []
-        for version in version_list:
+        for i, version in enumerate(version_list):
             task = generate_summaries_pipeline(
                 conversation_hashes=hashes,
                 version=version,
                 db_path=PATH_TO_DB,
                 experiment_id=experiment_id,
-                concurrency=concurrency
-                // len(version_list),  # Divide concurrency among versions
+                concurrency=max(1, per_version + (i < extra)),
                 show_progress=len(version_list)
                 == 1,  # Only show progress for single version
+                client=client,
             )
             tasks.append(task)
 
@@ -202,7 +232,14 @@ def embed_conversations(
     limit: Optional[int] = typer.Option(
         None, help="Limit number of conversations to embed"
     ),
-    batch_size: int = typer.Option(100, help="Batch size for embedding generation"),
+    batch_size: Optional[int] = typer.Option(
+        None,
+        help="Batch size for embedding generation (default: 100 for OpenAI models, 256 for local models)",
+    ),
+    backend: EmbeddingBackend = typer.Option(
+        EmbeddingBackend.torch,
+        help="Backend for local models. onnx and openvino need the matching sentence-transformers extra installed (see README)",
+    ),
     mode: str = typer.Option(
         "first_message", help="Embedding mode: 'first_message' or 'full'"
     ),
@@ -216,15 +253,13 @@ def embed_conversations(
         )
         raise typer.Exit(1)
 
-    # Get conversations
-    hashes = get_all_conversation_hashes(PATH_TO_DB, limit)
+    # Load full conversation data in one pass
+    conversations = get_conversations(PATH_TO_DB, limit)
 
-    if not hashes:
+    if not conversations:
         console.print("[red]No conversations found in database[/red]")
         raise typer.Exit(1)
 
-    # Load full conversation data
-    conversations = get_conversations_by_hashes(hashes, PATH_TO_DB)
     console.print(
         f"[blue]Embedding {len(conversations)} conversations (mode: {mode})[/blue]"
     )
@@ -238,6 +273,7 @@ def embed_conversations(
                 embedding_model=embedding_model,
                 output_dir=output_dir,
                 batch_size=batch_size,
+                backend=backend.value,
             )
         )
     else:  # full mode
@@ -249,6 +285,7 @@ def embed_conversations(
                 output_dir=output_dir,
                 batch_size=batch_size,
                 max_tokens=max_tokens,
+                backend=backend.value,
             )
         )
 
@@ -264,10 +301,17 @@ def embed_summaries(
     limit: Optional[int] = typer.Option(
         None, help="Limit number of summaries to embed"
     ),
-    batch_size: int = typer.Option(100, help="Batch size for embedding generation"),
+    batch_size: Optional[int] = typer.Option(
+        None,
+        help="Batch size for embedding generation (default: 100 for OpenAI models, 256 for local models)",
+    ),
+    backend: EmbeddingBackend = typer.Option(
+        EmbeddingBackend.torch,
+        help="Backend for local models. onnx and openvino need the matching sentence-transformers extra installed (see README)",
+    ),
 ):
     """Generate embeddings for summaries"""
-    engine = get_engine(PATH_TO_DB)
+    engine = get_read_engine(PATH_TO_DB)
 
     # Get summaries
     with Session(engine) as session:
@@ -304,6 +348,7 @@ def embed_summaries(
             embedding_model=embedding_model,
             output_dir=output_dir,
             batch_size=batch_size,
+            backend=backend.value,
         )
     )
 
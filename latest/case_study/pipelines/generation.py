@@ -3,10 +3,10 @@ Generation pipelines for questions and summaries
 """
 
 import asyncio
-import json
 import instructor
+import orjson
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Awaitable, Callable, List, Dict, Any, Optional, TypeVar
 from rich.console import Console
 from rich.progress import Progress, TaskID
 
@@ -15,6 +15,7 @@ from core.db import (
     save_questions_to_sqlite,
     save_summaries_to_sqlite,
     filter_unprocessed_hashes,
+    analyze_database,
 )
 from core.synthetic_queries import (
     synthetic_question_generation_v1,
@@ -33,6 +34,10 @@ from core.cache import setup_cache, GenericCache
 
 console = Console()
 
+# Newly generated results are buffered and written to the cache in small
+# batches; they were paid for, so keep little of them only in memory
+CACHE_FLUSH_SIZE = 20
+
 fn_query = {
     "v1": synthetic_question_generation_v1,
     "v2": synthetic_question_generation_v2,
@@ -49,12 +54,43 @@ fn_summary = {
 }
 
 
+def create_client():
+    """Create the async instructor client used for generation"""
+    return instructor.from_provider("openai/gpt-4.1-nano", async_client=True)
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def _run_worker_pool(
+    items: List[T], process: Callable[[T], Awaitable[R]], concurrency: int
+) -> List[R]:
+    """Run process over items with a fixed pool of workers, keeping input order
+
+    Workers pull from a shared queue, so only `concurrency` coroutines exist at
+    once instead of one suspended task per item.
+    """
+    results: List[Optional[R]] = [None] * len(items)
+    queue: asyncio.Queue = asyncio.Queue()
+    for entry in enumerate(items):
+        queue.put_nowait(entry)
+
+    async def worker() -> None:
+        while not queue.empty():
+            idx, item = queue.get_nowait()
+            results[idx] = await process(item)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(items)))))
+    return results
+
+
 def parse_conversation_messages(conv: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Parse conversation data into messages format expected by generation functions"""
     try:
         # Try to parse as JSON if it's a string
         if isinstance(conv.get("conversation_full"), str):
-            conversation_data = json.loads(conv["conversation_full"])
+            conversation_data = orjson.loads(conv["conversation_full"])
         else:
             conversation_data = conv.get("conversation_full", conv.get("text", ""))
 
@@ -64,7 +100,7 @@ def parse_conversation_messages(conv: Dict[str, Any]) -> List[Dict[str, Any]]:
 
         # Otherwise, create a simple message structure
         return [{"role": "user", "content": str(conversation_data)}]
-    except (json.JSONDecodeError, TypeError):
+    except (orjson.JSONDecodeError, TypeError):
         # Fallback to simple text format
         text = conv.get("text", conv.get("conversation_full", ""))
         return [{"role": "user", "content": str(text)}]
@@ -95,6 +131,9 @@ async def generate_questions_pipeline(
         f"[bold green]Generating questions with version: {version}[/bold green]"
     )
 
+    # Drop repeated hashes (keeping order) so nothing is looked up or generated twice
+    conversation_hashes = list(dict.fromkeys(conversation_hashes))
+
     # Filter out already processed conversations
     unprocessed_hashes = filter_unprocessed_hashes(
         conversation_hashes, version, db_path, experiment_id
@@ -110,7 +149,7 @@ async def generate_questions_pipeline(
         return {version: 0}
 
     # Initialize instructor client
-    client = instructor.from_provider("openai/gpt-4.1-nano", async_client=True)
+    client = create_client()
 
     # Set up cache
     cache_dir = db_path.parent / "cache" / "questions"
@@ -123,7 +162,25 @@ async def generate_questions_pipeline(
     results = {}
 
     questions = []
-    semaphore = asyncio.Semaphore(concurrency)
+    pending_cache_writes: Dict[str, List[str]] = {}
+
+    async def flush_cache_writes() -> None:
+        """Write buffered cache entries in a single batch"""
+        nonlocal pending_cache_writes
+        if pending_cache_writes:
+            batch, pending_cache_writes = pending_cache_writes, {}
+            await asyncio.to_thread(cache.set_many, batch)
+
+    # Look up every conversation's cached queries in one batched read up front
+    cached_by_key = {}
+    if cache is not None:
+        cached_by_key = await asyncio.to_thread(
+            cache.get_many,
+            [
+                GenericCache.make_conversation_key(conv["conversation_hash"], version)
+                for conv in conversations
+            ],
+        )
 
     with Progress() as progress:
         task = progress.add_task(
@@ -133,68 +190,71 @@ async def generate_questions_pipeline(
         async def process_conversation(
             conv: Dict[str, Any],
         ) -> List[Dict[str, Any]] | None:
-            async with semaphore:
-                try:
-                    conversation_hash = conv["conversation_hash"]
-
-                    # Check cache first
-                    if cache:
-                        cache_key = GenericCache.make_conversation_key(
-                            conversation_hash, version
-                        )
-                        cached_queries = cache.get(cache_key)
-                        if cached_queries is not None:
-                            # Convert cached queries to question data format
-                            question_data_list = []
-                            for query_idx, query in enumerate(cached_queries):
-                                question_data = {
-                                    "id": f"{conversation_hash}_{version}_{query_idx}",
-                                    "conversation_hash": conversation_hash,
-                                    "version": version,
-                                    "question": query,
-                                    "experiment_id": experiment_id,
-                                }
-                                question_data_list.append(question_data)
-                            progress.advance(task)
-                            return question_data_list
-
-                    # Parse conversation messages
-                    messages = parse_conversation_messages(conv)
-
-                    # Generate questions using the version
-                    generated = await fn_query[version](client, messages)
-
-                    # Cache the result
-                    if cache and generated.queries:
-                        cache_key = GenericCache.make_conversation_key(
-                            conversation_hash, version
-                        )
-                        cache.set(cache_key, generated.queries)
-
-                    # Create question data for each generated query
-                    question_data_list = []
-                    for idx, query in enumerate(generated.queries):
-                        question_data = {
-                            "id": f"{conversation_hash}_{version}_{idx}",
-                            "conversation_hash": conversation_hash,
-                            "version": version,
-                            "question": query,
-                            "experiment_id": experiment_id,
-                        }
-                        question_data_list.append(question_data)
-
-                    progress.advance(task)
-                    return question_data_list
-                except Exception as e:
-                    console.print(
-                        f"[red]Error processing {conv['conversation_hash']}: {e}[/red]"
+            try:
+                conversation_hash = conv["conversation_hash"]
+
+                # Check the prefetched cache entries first
+                if cache is not None:
+                    cache_key = GenericCache.make_conversation_key(
+                        conversation_hash, version
                     )
-                    progress.advance(task)
-                    return None
+                    cached_queries = cached_by_key.get(cache_key)
+                    if cached_queries is not None:
+                        # Convert cached queries to question data format
+                        question_data_list = []
+                        for query_idx, query in enumerate(cached_queries):
+                            question_data = {
+                                "id": f"{conversation_hash}_{version}_{query_idx}",
+                                "conversation_hash": conversation_hash,
+                                "version": version,
+                                "question": query,
+                                "experiment_id": experiment_id,
+                            }
+                            question_data_list.append(question_data)
+                        progress.advance(task)
+                        return question_data_list
 
-        # Process all conversations concurrently
-        tasks = [process_conversation(conv) for conv in conversations]
-        question_lists = await asyncio.gather(*tasks)
+                # Parse conversation messages
+                messages = parse_conversation_messages(conv)
+
+                # Generate questions using the version
+                generated = await fn_query[version](client, messages)
+
+                # Buffer the result for the next batched cache write
+                if cache is not None and generated.queries:
+                    pending_cache_writes[cache_key] = generated.queries
+                    if len(pending_cache_writes) >= CACHE_FLUSH_SIZE:
+                        await flush_cache_writes()
+
+                # Create question data for each generated query
+                question_data_list = []
+                for idx, query in enumerate(generated.queries):
+                    question_data = {
+                        "id": f"{conversation_hash}_{version}_{idx}",
+                        "conversation_hash": conversation_hash,
+                        "version": version,
+                        "question": query,
+                        "experiment_id": experiment_id,
+                    }
+                    question_data_list.append(question_data)
+
+                progress.advance(task)
+                return question_data_list
+            except Exception as e:
+                console.print(
+                    f"[red]Error processing {conv['conversation_hash']}: {e}[/red]"
+                )
+                progress.advance(task)
+                return None
+
+        # Process conversations with a bounded pool of workers, flushing the
+        # buffered cache writes even if the run fails or is interrupted
+        try:
+            question_lists = await _run_worker_pool(
+                conversations, process_conversation, concurrency
+            )
+        finally:
+            await flush_cache_writes()
 
         # Flatten the list of lists and filter out None results
         questions = []
@@ -203,9 +263,12 @@ async def generate_questions_pipeline(
                 questions.extend(q_list)
 
         # Save to database
-        saved_count = save_questions_to_sqlite(questions, db_path)
+        saved_count = await asyncio.to_thread(
+            save_questions_to_sqlite, questions, db_path
+        )
         results[version] = saved_count
         console.print(f"[green]Saved {saved_count} {version} questions[/green]")
+        await asyncio.to_thread(analyze_database, db_path)
 
     return results
 
@@ -218,14 +281,21 @@ async def generate_summaries_pipeline(
     concurrency: int = 10,
     use_cache: bool = True,
     show_progress: bool = True,
+    client: Optional[Any] = None,
 ) -> Dict[str, int]:
     """
     Generate summaries for conversations using specified techniques
+
+    Pass an instructor client to share one HTTP connection pool between
+    pipelines that run concurrently; otherwise a new client is created.
     """
     console.print(
         f"[bold green]Generating summaries with version: {version}[/bold green]"
     )
 
+    # Drop repeated hashes (keeping order) so nothing is looked up or generated twice
+    conversation_hashes = list(dict.fromkeys(conversation_hashes))
+
     # Filter out already processed conversations
     unprocessed_hashes = filter_unprocessed_hashes(
         conversation_hashes, version, db_path, experiment_id, is_summary=True
@@ -241,7 +311,8 @@ async def generate_summaries_pipeline(
         return {version: 0}
 
     # Initialize instructor client
-    client = instructor.from_provider("openai/gpt-4.1-nano", async_client=True)
+    if client is None:
+        client = create_client()
 
     # Set up cache
     # cache_dir = db_path.parent / "cache" / "summaries"
@@ -254,62 +325,63 @@ async def generate_summaries_pipeline(
     results = {}
 
     summaries = []
-    semaphore = asyncio.Semaphore(concurrency)
 
     async def process_conversation(
         conv: Dict[str, Any],
         progress_task: Optional[TaskID] = None,
         progress_obj: Optional[Progress] = None,
     ) -> Dict[str, Any] | None:
-        async with semaphore:
-            try:
-                # Parse conversation messages
-                messages = parse_conversation_messages(conv)
-
-                # Generate summary using the version
-                generated = await fn_summary[version](client, messages)
-
-                # Add metadata for saving
-                summary_data = {
-                    "id": f"{conv['conversation_hash']}_{version}",  # Keep unique ID for database
-                    "conversation_hash": conv["conversation_hash"],
-                    "technique": version,
-                    "summary": generated.summary,
-                    "experiment_id": experiment_id,
-                }
-
-                if progress_obj and progress_task is not None:
-                    progress_obj.advance(progress_task)
-                return summary_data
-            except Exception as e:
-                console.print(
-                    f"[red]Error processing {conv['conversation_hash']}: {e}[/red]"
-                )
-                if progress_obj and progress_task is not None:
-                    progress_obj.advance(progress_task)
-                return None
+        try:
+            # Parse conversation messages
+            messages = parse_conversation_messages(conv)
+
+            # Generate summary using the version
+            generated = await fn_summary[version](client, messages)
+
+            # Add metadata for saving
+            summary_data = {
+                "id": f"{conv['conversation_hash']}_{version}",  # Keep unique ID for database
+                "conversation_hash": conv["conversation_hash"],
+                "technique": version,
+                "summary": generated.summary,
+                "experiment_id": experiment_id,
+            }
+
+            if progress_obj and progress_task is not None:
+                progress_obj.advance(progress_task)
+            return summary_data
+        except Exception as e:
+            console.print(
+                f"[red]Error processing {conv['conversation_hash']}: {e}[/red]"
+            )
+            if progress_obj and progress_task is not None:
+                progress_obj.advance(progress_task)
+            return None
 
     if show_progress:
         with Progress() as progress:
             task = progress.add_task(
                 f"Generating {version} summaries", total=len(conversations)
             )
-            # Process all conversations concurrently
-            tasks = [
-                process_conversation(conv, task, progress) for conv in conversations
-            ]
-            summaries = await asyncio.gather(*tasks)
+            # Process conversations with a bounded pool of workers
+            summaries = await _run_worker_pool(
+                conversations,
+                lambda conv: process_conversation(conv, task, progress),
+                concurrency,
+            )
     else:
         # Process without progress bar
-        tasks = [process_conversation(conv) for conv in conversations]
-        summaries = await asyncio.gather(*tasks)
+        summaries = await _run_worker_pool(
+            conversations, process_conversation, concurrency
+        )
 
     # Filter out None results
     summaries = [s for s in summaries if s is not None]
 
     # Save to database
-    saved_count = save_summaries_to_sqlite(summaries, db_path)
+    saved_count = await asyncio.to_thread(save_summaries_to_sqlite, summaries, db_path)
     results[version] = saved_count
     console.print(f"[green]Saved {saved_count} {version} summaries[/green]")
+    await asyncio.to_thread(analyze_database, db_path)
 
     return results
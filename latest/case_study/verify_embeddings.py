@@ -36,8 +36,9 @@ def verify_embeddings():
         first_embedding = df.iloc[0]["embedding"]
         embedding_dim = len(first_embedding)
 
-        # Get unique versions
-        versions = sorted(df["version"].unique())
+        # Count rows per version in one grouping pass
+        version_counts = df["version"].value_counts().sort_index()
+        versions = list(version_counts.index)
 
         # Extract model name from filename
         model_name = parquet_file.stem.replace("questions_v1_v2_", "")
@@ -52,8 +53,7 @@ def verify_embeddings():
 
         # Show version breakdown
         console.print(f"\n[cyan]{model_name}:[/cyan]")
-        for version in versions:
-            count = len(df[df["version"] == version])
+        for version, count in version_counts.items():
             console.print(f"  - {version}: {count:,} questions")
 
     console.print()
@@ -75,9 +75,9 @@ def verify_embeddings():
         for idx, row in samples.iterrows():
             # Get question from the database
             from sqlmodel import Session, select
-            from core.db import get_engine, Question
+            from core.db import get_read_engine, Question
 
-            engine = get_engine(PATH_TO_DB)
+            engine = get_read_engine(PATH_TO_DB)
             with Session(engine) as session:
                 statement = select(Question).where(Question.id == row["id"])
                 question = session.exec(statement).first()